@@ -2,5 +2,10 @@
 # flake8: noqa
 
 from .reloader import start_reloader
-from .utils import is_watchdog_supported, is_watchman_supported
+from .utils import (
+    is_forkserver_supported,
+    is_inotify_supported,
+    is_watchdog_supported,
+    is_watchman_supported,
+)
 from .worker import get_reloader, is_active
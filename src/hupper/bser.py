@@ -0,0 +1,246 @@
+"""
+A minimal implementation of watchman's BSER binary protocol.
+
+See https://facebook.github.io/watchman/docs/bser.html
+
+"""
+
+import struct
+
+BSER_ARRAY = 0x00
+BSER_OBJECT = 0x01
+BSER_BYTESTRING = 0x02
+BSER_INT8 = 0x03
+BSER_INT16 = 0x04
+BSER_INT32 = 0x05
+BSER_INT64 = 0x06
+BSER_REAL = 0x07
+BSER_TRUE = 0x08
+BSER_FALSE = 0x09
+BSER_NULL = 0x0A
+BSER_TEMPLATE = 0x0B
+BSER_SKIP = 0x0C
+BSER_UTF8STRING = 0x0D
+
+MAGIC_V1 = b'\x00\x01'
+MAGIC_V2 = b'\x00\x02'
+
+# integers are encoded in the native byte order of the host
+_ints = {
+    BSER_INT8: struct.Struct('=b'),
+    BSER_INT16: struct.Struct('=h'),
+    BSER_INT32: struct.Struct('=i'),
+    BSER_INT64: struct.Struct('=q'),
+}
+_real = struct.Struct('=d')
+_capabilities = struct.Struct('=I')
+
+
+class BserError(ValueError):
+    """Raised when a PDU cannot be decoded."""
+
+
+def _encode_int(buf, value):
+    for tag in (BSER_INT8, BSER_INT16, BSER_INT32, BSER_INT64):
+        fmt = _ints[tag]
+        bits = fmt.size * 8 - 1
+        if -(1 << bits) <= value < (1 << bits):
+            buf.append(tag)
+            buf += fmt.pack(value)
+            return
+    raise BserError('integer out of range: %r' % (value,))
+
+
+def _encode(buf, value):
+    if value is None:
+        buf.append(BSER_NULL)
+    elif value is True:
+        buf.append(BSER_TRUE)
+    elif value is False:
+        buf.append(BSER_FALSE)
+    elif isinstance(value, int):
+        _encode_int(buf, value)
+    elif isinstance(value, float):
+        buf.append(BSER_REAL)
+        buf += _real.pack(value)
+    elif isinstance(value, (str, bytes)):
+        if isinstance(value, str):
+            value = value.encode('utf8', 'surrogateescape')
+        buf.append(BSER_BYTESTRING)
+        _encode_int(buf, len(value))
+        buf += value
+    elif isinstance(value, (list, tuple)):
+        buf.append(BSER_ARRAY)
+        _encode_int(buf, len(value))
+        for item in value:
+            _encode(buf, item)
+    elif isinstance(value, dict):
+        buf.append(BSER_OBJECT)
+        _encode_int(buf, len(value))
+        for k, v in value.items():
+            _encode(buf, k)
+            _encode(buf, v)
+    else:
+        raise BserError('cannot encode %r' % (value,))
+
+
+def dumps(value):
+    """Encode ``value`` into a BSER v1 PDU."""
+    payload = bytearray()
+    _encode(payload, value)
+    pdu = bytearray(MAGIC_V1)
+    _encode_int(pdu, len(payload))
+    pdu += payload
+    return bytes(pdu)
+
+
+def _decode_int(buf, pos):
+    fmt = _ints.get(buf[pos])
+    if fmt is None:
+        raise BserError('expected an integer at offset %d' % pos)
+    return fmt.unpack_from(buf, pos + 1)[0], pos + 1 + fmt.size
+
+
+def parse_header(buf, start, end):
+    """
+    Parse a PDU header from ``buf[start:end]``.
+
+    Returns a tuple of ``(header_size, payload_size)`` or ``None`` if more
+    data is required to parse the header.
+
+    """
+    if end - start < 3:
+        return None
+    magic = bytes(buf[start : start + 2])
+    pos = start + 2
+    if magic == MAGIC_V2:
+        # skip the capabilities
+        pos += _capabilities.size
+    elif magic != MAGIC_V1:
+        raise BserError('invalid BSER header')
+    if pos >= end:
+        return None
+    fmt = _ints.get(buf[pos])
+    if fmt is None:
+        raise BserError('invalid BSER header')
+    if pos + 1 + fmt.size > end:
+        return None
+    size, pos = _decode_int(buf, pos)
+    return pos - start, size
+
+
+class _Decoder:
+    def __init__(self, buf):
+        self.buf = buf
+
+    def decode(self, pos):
+        buf = self.buf
+        tag = buf[pos]
+        if tag == BSER_ARRAY:
+            count, pos = _decode_int(buf, pos + 1)
+            items = []
+            for _ in range(count):
+                item, pos = self.decode(pos)
+                items.append(item)
+            return items, pos
+        if tag == BSER_OBJECT:
+            count, pos = _decode_int(buf, pos + 1)
+            obj = {}
+            for _ in range(count):
+                key, pos = self.decode_string(pos)
+                obj[key], pos = self.decode(pos)
+            return obj, pos
+        if tag in (BSER_BYTESTRING, BSER_UTF8STRING):
+            return self.decode_string(pos)
+        if tag in _ints:
+            return _decode_int(buf, pos)
+        if tag == BSER_REAL:
+            return _real.unpack_from(buf, pos + 1)[0], pos + 1 + _real.size
+        if tag == BSER_TRUE:
+            return True, pos + 1
+        if tag == BSER_FALSE:
+            return False, pos + 1
+        if tag == BSER_NULL:
+            return None, pos + 1
+        if tag == BSER_TEMPLATE:
+            keys, pos = self.decode(pos + 1)
+            count, pos = _decode_int(buf, pos)
+            rows = []
+            for _ in range(count):
+                row = {}
+                for key in keys:
+                    if buf[pos] == BSER_SKIP:
+                        pos += 1
+                        continue
+                    row[key], pos = self.decode(pos)
+                rows.append(row)
+            return rows, pos
+        raise BserError('invalid type %#x at offset %d' % (tag, pos))
+
+    def decode_string(self, pos):
+        buf = self.buf
+        if buf[pos] not in (BSER_BYTESTRING, BSER_UTF8STRING):
+            raise BserError('expected a string at offset %d' % pos)
+        size, pos = _decode_int(buf, pos + 1)
+        if pos + size > len(buf):
+            raise IndexError
+        value = str(buf[pos : pos + size], 'utf8', 'surrogateescape')
+        return value, pos + size
+
+    def skip(self, pos):
+        """Return the offset after the value at ``pos`` without decoding."""
+        buf = self.buf
+        tag = buf[pos]
+        if tag == BSER_ARRAY:
+            count, pos = _decode_int(buf, pos + 1)
+            for _ in range(count):
+                pos = self.skip(pos)
+            return pos
+        if tag == BSER_OBJECT:
+            count, pos = _decode_int(buf, pos + 1)
+            for _ in range(count):
+                pos = self.skip(self.skip(pos))
+            return pos
+        if tag in (BSER_BYTESTRING, BSER_UTF8STRING):
+            size, pos = _decode_int(buf, pos + 1)
+            return pos + size
+        if tag in _ints:
+            return pos + 1 + _ints[tag].size
+        if tag == BSER_REAL:
+            return pos + 1 + _real.size
+        if tag in (BSER_TRUE, BSER_FALSE, BSER_NULL, BSER_SKIP):
+            return pos + 1
+        if tag == BSER_TEMPLATE:
+            keys, pos = self.decode(pos + 1)
+            count, pos = _decode_int(buf, pos)
+            for _ in range(count * len(keys)):
+                pos = self.skip(pos)
+            return pos
+        raise BserError('invalid type %#x at offset %d' % (tag, pos))
+
+
+def loads(payload, keys=None):
+    """
+    Decode a BSER ``payload``, which does not include the PDU header.
+
+    If ``keys`` is supplied and the payload is an object, then only the
+    values for those keys are decoded and the rest are skipped.
+
+    """
+    decoder = _Decoder(payload)
+    try:
+        if keys is None or payload[0] != BSER_OBJECT:
+            value, _ = decoder.decode(0)
+            return value
+
+        count, pos = _decode_int(payload, 1)
+        obj = {}
+        for _ in range(count):
+            key, pos = decoder.decode_string(pos)
+            if key in keys:
+                obj[key], pos = decoder.decode(pos)
+            else:
+                pos = decoder.skip(pos)
+        return obj
+    except (IndexError, struct.error) as ex:
+        raise BserError('truncated BSER payload') from ex
@@ -4,6 +4,7 @@ import sys
 
 from .logger import LogLevel
 from .reloader import start_reloader
+from .utils import parse_address
 
 
 def interval_parser(string):
@@ -18,18 +19,102 @@ def interval_parser(string):
         raise argparse.ArgumentTypeError(msg)
 
 
-def main():
+def workers_parser(string):
+    """Parses the number of workers into an int greater than 0."""
+    msg = "Number of workers must be an int greater than 0"
+    try:
+        value = int(string)
+        if value <= 0:
+            raise argparse.ArgumentTypeError(msg)
+        return value
+    except ValueError:
+        raise argparse.ArgumentTypeError(msg)
+
+
+def settle_interval_parser(string):
+    """Parses the settle interval into a float greater than or equal to 0."""
+    msg = "Interval must be a number greater than or equal to 0"
+    try:
+        value = float(string)
+        if value < 0:
+            raise argparse.ArgumentTypeError(msg)
+        return value
+    except ValueError:
+        raise argparse.ArgumentTypeError(msg)
+
+
+def bind_parser(string):
+    """Validates a listen address."""
+    try:
+        parse_address(string)
+    except ValueError as ex:
+        raise argparse.ArgumentTypeError(str(ex))
+    return string
+
+
+def service_parser(string):
+    """Parses a service into a tuple of ``(name, module)``."""
+    name, sep, module = string.partition("=")
+    if not sep or not name or not module:
+        raise argparse.ArgumentTypeError(
+            "Service must be specified as NAME=MODULE"
+        )
+    return name, module
+
+
+def main(service=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument("-m", dest="module", required=True)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-m", dest="module")
+    target.add_argument(
+        "--service",
+        dest="services",
+        action="append",
+        metavar="NAME=MODULE",
+        type=service_parser,
+    )
     parser.add_argument("-w", dest="watch", action="append")
     parser.add_argument("-x", dest="ignore", action="append")
     parser.add_argument("-v", dest="verbose", action='store_true')
     parser.add_argument("-q", dest="quiet", action='store_true')
     parser.add_argument("--shutdown-interval", type=interval_parser)
     parser.add_argument("--reload-interval", type=interval_parser)
+    parser.add_argument(
+        "--verify-changes", dest="verify_changes", action='store_true'
+    )
+    parser.add_argument(
+        "--wait-for-vcs", dest="wait_for_vcs", action='store_true'
+    )
+    parser.add_argument("--watch-manifest", dest="watch_manifest")
+    parser.add_argument("--standby", dest="standby", action='store_true')
+    parser.add_argument(
+        "--fork-server", dest="fork_server", action='store_true'
+    )
+    parser.add_argument("--blue-green", dest="blue_green", action='store_true')
+    parser.add_argument("--hot-reload", dest="hot_reload", action='store_true')
+    parser.add_argument(
+        "--bind", dest="bind", action="append", type=bind_parser
+    )
+    parser.add_argument("--workers", dest="workers", type=workers_parser)
+    parser.add_argument(
+        "--proxy",
+        dest="proxy",
+        nargs=2,
+        metavar=("LISTEN", "TARGET"),
+        type=bind_parser,
+    )
+    parser.add_argument(
+        "--settle-interval",
+        dest="settle_interval",
+        type=settle_interval_parser,
+    )
 
     args, unknown_args = parser.parse_known_args()
 
+    services = dict(args.services or [])
+    if args.services and len(services) != len(args.services):
+        parser.error("service names must be unique")
+
     if args.quiet:
         level = LogLevel.ERROR
 
@@ -46,11 +131,30 @@ def main():
         reloader_kw['reload_interval'] = args.reload_interval
     if args.shutdown_interval is not None:
         reloader_kw['shutdown_interval'] = args.shutdown_interval
+    if args.settle_interval is not None:
+        reloader_kw['settle_interval'] = args.settle_interval
+    if args.workers is not None:
+        reloader_kw['workers'] = args.workers
+    if services:
+        # each service runs this function again to find its module
+        reloader_kw['services'] = {
+            name: ("hupper.cli.main", None, {"service": name})
+            for name in services
+        }
 
     reloader = start_reloader(
         "hupper.cli.main",
         verbose=level,
         ignore_files=args.ignore,
+        verify_changes=args.verify_changes,
+        wait_for_vcs=args.wait_for_vcs,
+        watch_manifest=args.watch_manifest,
+        standby=args.standby,
+        fork_server=args.fork_server,
+        blue_green=args.blue_green,
+        hot_reload=args.hot_reload,
+        bind=args.bind,
+        proxy=args.proxy,
         **reloader_kw,
     )
 
@@ -60,4 +164,5 @@ def main():
     if args.watch:
         reloader.watch_files(args.watch)
 
-    return runpy.run_module(args.module, alter_sys=True, run_name="__main__")
+    module = services[service] if service is not None else args.module
+    return runpy.run_module(module, alter_sys=True, run_name="__main__")
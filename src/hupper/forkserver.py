@@ -0,0 +1,316 @@
+# check ``hupper.utils.is_forkserver_supported`` before using this module
+import atexit
+import fcntl
+from multiprocessing import reduction
+import os
+import queue
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import traceback
+
+from . import ipc
+from .utils import resolve_spec
+
+
+class ForkedProcess:
+    """
+    A process forked by a :class:`.ForkServer`.
+
+    It mimics enough of ``subprocess.Popen`` to be managed by
+    :func:`hupper.ipc.wait` and :func:`hupper.ipc.kill`. The process is a
+    child of the zygote and is reaped by it, the exit code is reported back
+    over the zygote's pipe.
+
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+        self.exited = threading.Event()
+
+    def _set_returncode(self, returncode):
+        self.returncode = returncode
+        self.exited.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self.exited.wait(timeout):
+            raise subprocess.TimeoutExpired(str(self.pid), timeout)
+        return self.returncode
+
+    def send_signal(self, signum):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signum)
+            except ProcessLookupError:  # pragma: no cover
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ForkServer:
+    """
+    Fork processes from a long-lived zygote process.
+
+    The zygote imports the modules sent to :meth:`preload` once, such that
+    every process forked from it starts with them already loaded instead of
+    importing them again.
+
+    ``on_exit`` is an optional callable invoked from a background thread
+    whenever a forked process exits.
+
+    """
+
+    def __init__(self, logger, on_exit=None):
+        self.logger = logger
+        self.on_exit = on_exit
+        self.modules = {}
+        self.process = None
+        self.pipe = None
+        self.sock = None
+        self.processes = {}
+        self.replies = queue.Queue()
+        self.lock = threading.Lock()
+        self.stopping = False
+
+    @property
+    def paths(self):
+        """The files of the modules preloaded into the zygote."""
+        return set(self.modules.values())
+
+    @property
+    def is_alive(self):
+        return self.process is not None and ipc.wait(self.process, 0) is None
+
+    def start(self, modules=None):
+        self.pipe, child_pipe = ipc.Pipe()
+        self.sock, child_sock = socket.socketpair()
+        try:
+            self.process = ipc.spawn(
+                __name__ + '.zygote_main',
+                kwargs={'pipe': child_pipe, 'sock_fd': child_sock.fileno()},
+                pass_fds=[
+                    child_pipe.r_fd,
+                    child_pipe.w_fd,
+                    child_sock.fileno(),
+                ],
+            )
+        finally:
+            child_pipe.close()
+            child_sock.close()
+        self.stopping = False
+        self.replies = queue.Queue()
+        self.pipe.activate(self._handle_packet)
+        self.logger.debug(
+            'Started fork server PID {}.'.format(self.process.pid)
+        )
+        if modules:
+            self.preload(modules)
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.stopping = True
+        ipc.kill(self.process, soft=True)
+        if ipc.wait(self.process, timeout=1) is None:  # pragma: no cover
+            ipc.kill(self.process)
+        ipc.wait(self.process)
+        self.pipe.close()
+        self.sock.close()
+        self.process = self.pipe = self.sock = None
+        self.modules = {}
+
+    def preload(self, modules):
+        """
+        Import ``modules``, a dict mapping module names to their files, into
+        the zygote.
+
+        """
+        names = [name for name in modules if name not in self.modules]
+        if names and self.pipe is not None:
+            for name in names:
+                self.modules[name] = modules[name]
+            self.pipe.send(('preload', sorted(names)))
+
+    def spawn(self, spec, kwargs, pass_fds=()):
+        """
+        Invoke a python function in a process forked from the zygote.
+
+        This behaves like :func:`hupper.ipc.spawn` and the ``pass_fds`` are
+        available in the new process using the same numbers.
+
+        """
+        with self.lock:
+            if pass_fds:
+                reduction.sendfds(self.sock, pass_fds)
+            self.pipe.send(('fork', spec, kwargs, list(pass_fds)))
+            reply = self.replies.get()
+        if reply is None:
+            raise RuntimeError('fork server exited unexpectedly')
+        if isinstance(reply, str):
+            raise RuntimeError('fork server failed to fork: ' + reply)
+        return reply
+
+    def _handle_packet(self, packet):
+        if packet is None:
+            self._handle_exit()
+
+        elif packet[0] == 'forked':
+            process = ForkedProcess(packet[1])
+            self.processes[process.pid] = process
+            self.replies.put(process)
+
+        elif packet[0] == 'error':
+            self.replies.put(packet[1])
+
+        elif packet[0] == 'exit':
+            process = self.processes.pop(packet[1], None)
+            if process is not None:
+                process._set_returncode(packet[2])
+                if self.on_exit is not None:
+                    self.on_exit()
+
+    def _handle_exit(self):
+        if not self.stopping:
+            self.logger.error('Fork server exited unexpectedly.')
+        self.replies.put(None)
+        processes, self.processes = self.processes, {}
+        for process in processes.values():
+            # nobody is left to reap these so do not let them linger
+            process.kill()
+            process._set_returncode(-signal.SIGKILL)
+        if processes and self.on_exit is not None:
+            self.on_exit()
+
+
+def get_exitcode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def remap_fds(fds, targets):
+    """Move each fd in ``fds`` to the corresponding number in ``targets``."""
+    # move them out of the way first so that a target is not clobbered
+    lowest = max(list(fds) + list(targets)) + 1
+    tmp_fds = []
+    for fd in fds:
+        tmp_fds.append(fcntl.fcntl(fd, fcntl.F_DUPFD, lowest))
+        os.close(fd)
+    for fd, target in zip(tmp_fds, targets):
+        os.dup2(fd, target)
+        os.close(fd)
+
+
+def zygote_main(pipe, sock_fd):
+    sock = socket.socket(fileno=sock_fd)
+
+    # a ctrl-c is sent to the whole process group and should only stop
+    # the forked workers, the reloader terminates the zygote
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # wake up the loop when a forked process exits so that it is reaped
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda *args: None)
+
+    def cleanup_child():
+        # invoked in a forked process to drop the state of the zygote
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.close(wakeup_r)
+        os.close(wakeup_w)
+        pipe.close()
+        sock.close()
+
+    while True:
+        readable, _, _ = select.select([pipe.r_fd, wakeup_r], [], [])
+        if wakeup_r in readable:
+            while True:
+                try:
+                    if not os.read(wakeup_r, 512):  # pragma: no cover
+                        break
+                except BlockingIOError:
+                    break
+            reap_children(pipe)
+
+        if pipe.r_fd in readable:
+            packet = pipe.recv()
+            if packet is None:
+                break
+
+            if packet[0] == 'preload':
+                ipc.preload_modules(packet[1])
+
+            elif packet[0] == 'fork':
+                _, spec, kwargs, targets = packet
+                fds = reduction.recvfds(sock, len(targets)) if targets else []
+                fork_child(pipe, fds, targets, spec, kwargs, cleanup_child)
+
+
+def reap_children(pipe):
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        pipe.send(('exit', pid, get_exitcode(status)))
+
+
+def fork_child(pipe, fds, targets, spec, kwargs, cleanup):
+    try:
+        pid = os.fork()
+    except OSError as ex:
+        for fd in fds:
+            os.close(fd)
+        pipe.send(('error', str(ex)))
+        return
+
+    if pid == 0:  # pragma: no cover
+        code = 1
+        try:
+            cleanup()
+            remap_fds(fds, targets)
+            code = run_child(spec, kwargs)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    for fd in fds:
+        os.close(fd)
+    pipe.send(('forked', pid))
+
+
+def run_child(spec, kwargs):  # pragma: no cover
+    try:
+        try:
+            func = resolve_spec(spec)
+            func(**kwargs)
+        finally:
+            atexit._run_exitfuncs()
+    except SystemExit as ex:
+        if ex.code is None:
+            return 0
+        if isinstance(ex.code, int):
+            return ex.code
+        sys.stderr.write('{}\n'.format(ex.code))
+        return 1
+    return 0
@@ -0,0 +1,191 @@
+# check ``hupper.utils.is_inotify_supported`` before using this module
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+
+from .interfaces import IFileMonitor
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# IN_MODIFY is deliberately excluded because it fires for every write(2) and
+# would report half-written files, IN_CLOSE_WRITE fires once the writer is
+# done and IN_MOVED_TO catches editors that save by renaming a temp file
+# over the original
+WATCH_MASK = (
+    IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+_event_header = struct.Struct('iIII')
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_init1.restype = ctypes.c_int
+    libc.inotify_add_watch.argtypes = [
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_uint32,
+    ]
+    libc.inotify_add_watch.restype = ctypes.c_int
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    libc.inotify_rm_watch.restype = ctypes.c_int
+    return libc
+
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+class InotifyFileMonitor(threading.Thread, IFileMonitor):
+    """
+    An :class:`hupper.interfaces.IFileMonitor` that uses the Linux
+    ``inotify`` API directly to watch for file changes.
+
+    A single watch is registered for the parent folder of each tracked file
+    and events are read from the inotify file descriptor in bulk.
+
+    ``callback`` is a callable that accepts a path to a changed file.
+
+    ``logger`` is an :class:`hupper.interfaces.ILogger` instance.
+
+    ``interval`` is the maximum number of seconds to block waiting for
+    events before checking if the monitor has been stopped.
+
+    """
+
+    read_size = 64 * 1024
+
+    def __init__(self, callback, logger, interval=1, **kw):
+        super(InotifyFileMonitor, self).__init__()
+        self.callback = callback
+        self.logger = logger
+        self.timeout = interval
+        self.paths = set()
+        self.dirpaths = {}
+        self.wds = {}
+        self.lock = threading.Lock()
+        self.enabled = True
+        self._libc = _load_libc()
+        self._fd = _check(self._libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK))
+
+    def add_path(self, path):
+        with self.lock:
+            dirpath = os.path.dirname(path)
+            if dirpath not in self.dirpaths:
+                try:
+                    wd = _check(
+                        self._libc.inotify_add_watch(
+                            self._fd, os.fsencode(dirpath), WATCH_MASK
+                        )
+                    )
+                except OSError as ex:
+                    # missing folders, or hitting the max_user_watches limit
+                    self.logger.error('inotify error: ' + str(ex))
+                else:
+                    self.dirpaths[dirpath] = wd
+                    self.wds[wd] = dirpath
+
+            if path not in self.paths:
+                self.paths.add(path)
+
+    def run(self):
+        while self.enabled:
+            try:
+                ready_r, _, _ = select.select([self._fd], [], [], self.timeout)
+                if not ready_r:
+                    continue
+                data = os.read(self._fd, self.read_size)
+            except OSError as ex:
+                if ex.errno in (errno.EAGAIN, errno.EINTR):
+                    continue
+                if ex.errno in (errno.EBADF, errno.EINVAL):
+                    # the descriptor was closed by join
+                    break
+                raise
+            except ValueError:
+                # select raises ValueError for a closed descriptor (-1)
+                break
+
+            for path in self._handle_events(data):
+                self.callback(path)
+
+    def stop(self):
+        self.enabled = False
+
+    def join(self):
+        try:
+            return super(InotifyFileMonitor, self).join()
+        finally:
+            self._close()
+
+    def _close(self):
+        fd, self._fd = self._fd, -1
+        if fd >= 0:
+            os.close(fd)
+
+    def _handle_events(self, data):
+        changes = []
+        with self.lock:
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, size = _event_header.unpack_from(data, offset)
+                offset += _event_header.size
+                name = data[offset : offset + size].rstrip(b'\0')
+                offset += size
+
+                if mask & IN_Q_OVERFLOW:
+                    self.logger.error(
+                        'inotify event queue overflowed, some changes may'
+                        ' have been missed.'
+                    )
+                    continue
+
+                dirpath = self.wds.get(wd)
+                if dirpath is None:
+                    continue
+
+                if mask & IN_IGNORED:
+                    # the folder was deleted or unmounted and the kernel has
+                    # dropped the watch, forget it so it can be re-added
+                    del self.wds[wd]
+                    self.dirpaths.pop(dirpath, None)
+                    continue
+
+                if not name or mask & IN_ISDIR:
+                    continue
+
+                path = os.path.join(dirpath, os.fsdecode(name))
+                if path in self.paths and path not in changes:
+                    changes.append(path)
+        return changes
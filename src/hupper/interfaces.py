@@ -14,6 +14,27 @@ class IReloaderProxy(ABC):
     def graceful_shutdown(self):
         """Signal the monitor to gracefully shutdown."""
 
+    @abstractmethod
+    def ready(self):
+        """
+        Signal the monitor that the worker is ready to serve.
+
+        With ``blue_green`` reloads the previous worker keeps running until
+        the new one invokes this method.
+
+        """
+
+    @abstractmethod
+    def sockets(self):
+        """
+        Return a list of listening sockets bound by the monitor, in the order
+        of the ``bind`` addresses passed to :func:`hupper.start_reloader`.
+
+        The sockets stay open across reloads such that connections made
+        while the worker is restarting wait in the backlog.
+
+        """
+
 
 class IFileMonitorFactory(ABC):
     @abstractmethod
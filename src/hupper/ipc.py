@@ -1,7 +1,9 @@
 import errno
+import importlib
 import io
 import os
 import pickle
+import signal
 import struct
 import subprocess
 import sys
@@ -112,13 +114,13 @@ class Connection:
 
     _packet_len = struct.Struct('Q')
 
-    send_lock = None
     reader_thread = None
     on_recv = lambda _: None
 
     def __init__(self, r_fd, w_fd):
         self.r_fd = r_fd
         self.w_fd = w_fd
+        self.send_lock = threading.Lock()
 
     def __getstate__(self):
         return {
@@ -129,12 +131,11 @@ class Connection:
     def __setstate__(self, state):
         self.r_fd = open_handle(state['r_handle'], 'rb')
         self.w_fd = open_handle(state['w_handle'], 'wb')
+        self.send_lock = threading.Lock()
 
     def activate(self, on_recv):
         self.on_recv = on_recv
 
-        self.send_lock = threading.Lock()
-
         self.reader_thread = threading.Thread(target=self._read_loop)
         self.reader_thread.daemon = True
         self.reader_thread.start()
@@ -149,6 +150,19 @@ class Connection:
         if self.reader_thread:
             self.reader_thread.join()
 
+    def recv(self):
+        """
+        Block until a packet is received, returning ``None`` if the other
+        end of the pipe is closed.
+
+        This may only be used on a connection that has not been activated.
+
+        """
+        try:
+            return self._recv_packet()
+        except EOFError:
+            return None
+
     def _recv_packet(self):
         buf = io.BytesIO()
         chunk = os.read(self.r_fd, self._packet_len.size)
@@ -302,6 +316,21 @@ def spawn(spec, kwargs, pass_fds=()):
     """
     Invoke a python function in a subprocess.
 
+    """
+    process, to_child = prespawn(pass_fds)
+    resume(to_child, spec, kwargs)
+    return process
+
+
+def prespawn(pass_fds=(), preload=()):
+    """
+    Start a python subprocess which prepares itself and imports the
+    ``preload`` modules before waiting for a function to invoke.
+
+    Returns the process and a file used to send the function to the process
+    via :func:`.resume`. Closing the file without resuming the process will
+    cause it to exit.
+
     """
     r, w = os.pipe()
     for fd in [r] + list(pass_fds):
@@ -311,23 +340,59 @@ def spawn(spec, kwargs, pass_fds=()):
 
     r_handle = get_handle(r)
     args, env = get_command_line(pipe_handle=r_handle)
-    process = subprocess.Popen(args, env=env, close_fds=False)
+    try:
+        process = subprocess.Popen(args, env=env, close_fds=False)
+    finally:
+        # the child has its own copies now and any process spawned later
+        # must not inherit them
+        for fd in pass_fds:
+            set_inheritable(fd, False)
+        close_fd(r)
 
     to_child = os.fdopen(w, 'wb')
-    to_child.write(pickle.dumps([preparation_data, spec, kwargs]))
-    to_child.close()
+    to_child.write(pickle.dumps([preparation_data, list(preload)]))
+    to_child.flush()
+    return process, to_child
+
+
+def resume(to_child, spec, kwargs):
+    """Invoke a function in a process created by :func:`.prespawn`."""
+    try:
+        to_child.write(pickle.dumps([spec, kwargs]))
+    finally:
+        to_child.close()
 
-    return process
+
+def preload_modules(names):
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
 
 
 def spawn_main(pipe_handle):
     fd = open_handle(pipe_handle, 'rb')
     from_parent = os.fdopen(fd, 'rb')
-    preparation_data, spec, kwargs = pickle.load(from_parent)
-    from_parent.close()
+    preparation_data, preload = pickle.load(from_parent)
 
     prepare(preparation_data)
 
+    # a process may be parked here for a while and should not be disturbed
+    # by a ctrl-c sent to the process group until it is put to work
+    default_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        preload_modules(preload)
+        try:
+            spec, kwargs = pickle.load(from_parent)
+        except EOFError:
+            # the parent discarded the process
+            sys.exit(0)
+        finally:
+            from_parent.close()
+    finally:
+        signal.signal(signal.SIGINT, default_handler)
+
     func = resolve_spec(spec)
     func(**kwargs)
     sys.exit(0)
@@ -1,8 +1,13 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import math
 import os
 import threading
 import time
 
 from .interfaces import IFileMonitor
+from .logger import SilentLogger
+from .utils import WIN
 
 
 class PollingFileMonitor(threading.Thread, IFileMonitor):
@@ -15,43 +20,259 @@ class PollingFileMonitor(threading.Thread, IFileMonitor):
     ``interval`` is a value in seconds between scans of the files on disk.
     Do not set this too low or it will eat your CPU and kill your drive.
 
+    Files are split into two tiers. Hot files, which were modified within the
+    last ``hot_window`` seconds, are scanned every ``interval``. Cold files
+    are scanned at least every ``cold_interval`` seconds, spread evenly
+    across the scans instead of all at once. ``cold_interval`` defaults to
+    the ``interval`` such that every file is scanned each interval, raise it
+    to scan cold files less often at the cost of detecting the first change
+    to a cold file up to ``cold_interval`` seconds later.
+
+    ``max_stats_per_second`` is an optional budget used to pace the scans
+    such that the disk is not hit with a burst of requests at the start of
+    every ``interval``. Hot files are always scanned, the budget limits how
+    many cold files are scanned per ``interval``.
+
+    Files are grouped by their parent folder and folders containing at least
+    ``scandir_threshold`` scheduled files are refreshed together. On Windows
+    a single :func:`os.scandir` pass is used because the listing carries the
+    stat data. Elsewhere the folder is opened once and each file is stat-ed
+    relative to it, avoiding a lookup of the full path per file without
+    listing every entry in the folder.
+
+    ``max_workers`` enables scanning folders concurrently from a pool of
+    threads which helps on high-latency filesystems such as NFS where each
+    ``stat`` may take milliseconds. The folders are split into at most
+    ``max_workers`` shards of similar size.
+
+    ``logger`` is an :class:`hupper.interfaces.ILogger` instance used to
+    report scans that take longer than the ``interval``.
+
     """
 
-    def __init__(self, callback, interval=1, **kw):
+    scandir_threshold = 2
+
+    def __init__(
+        self,
+        callback,
+        interval=1,
+        cold_interval=None,
+        hot_window=3600,
+        max_stats_per_second=None,
+        max_workers=None,
+        logger=None,
+        **kw,
+    ):
         super(PollingFileMonitor, self).__init__()
         self.callback = callback
+        self.logger = logger or SilentLogger()
         self.poll_interval = interval
+        if cold_interval is None:
+            cold_interval = interval
+        self.cold_interval = max(cold_interval, interval)
+        self.hot_window = hot_window
+        self.max_stats_per_second = max_stats_per_second
+        self.throttle = Throttle(max_stats_per_second)
+        self.max_workers = max_workers
+        self.executor = None
+        self.is_overrunning = False
         self.paths = set()
         self.mtimes = {}
+        self.new_paths = []
+        self.hot_paths = set()
+        self.cold_paths = deque()
         self.lock = threading.Lock()
         self.enabled = True
 
     def add_path(self, path):
         with self.lock:
-            self.paths.add(path)
+            if path not in self.paths:
+                self.paths.add(path)
+                self.new_paths.append(path)
 
     def run(self):
-        while self.enabled:
-            with self.lock:
-                paths = list(self.paths)
-            self.check_reload(paths)
-            time.sleep(self.poll_interval)
+        try:
+            while self.enabled:
+                start = time.monotonic()
+                paths = self.select_paths()
+                self.check_reload(paths)
+                self.update_tiers(paths)
+                elapsed = time.monotonic() - start
+                self.report_overrun(elapsed, len(paths))
+                dt = self.poll_interval - elapsed
+                if dt > 0:
+                    time.sleep(dt)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def report_overrun(self, elapsed, count):
+        is_overrunning = elapsed > self.poll_interval
+        if is_overrunning and not self.is_overrunning:
+            self.logger.info(
+                'Scanning {} files took {:.2f} seconds which is longer than'
+                ' the polling interval of {} seconds.'.format(
+                    count, elapsed, self.poll_interval
+                )
+            )
+        self.is_overrunning = is_overrunning
 
     def stop(self):
         self.enabled = False
 
+    def select_paths(self):
+        """Return the paths that are due to be scanned this interval."""
+        with self.lock:
+            paths, self.new_paths = self.new_paths, []
+        paths.extend(self.hot_paths)
+
+        # scan a slice of the cold files each interval such that every file
+        # is visited once per cold_interval
+        count = len(self.cold_paths)
+        quota = math.ceil(count * self.poll_interval / self.cold_interval)
+        if self.max_stats_per_second:
+            budget = int(self.max_stats_per_second * self.poll_interval)
+            quota = min(quota, max(budget - len(paths), 0))
+        for _ in range(min(quota, count)):
+            paths.append(self.cold_paths.popleft())
+        return paths
+
+    def update_tiers(self, paths):
+        """Move freshly scanned paths into the hot or cold tier."""
+        cutoff = time.time() - self.hot_window
+        for path in paths:
+            mtime = self.mtimes.get(path, 0)
+            # missing files are cheap to stat and are likely about to be
+            # created so they are kept in the hot tier
+            if not mtime or mtime > cutoff:
+                self.hot_paths.add(path)
+            else:
+                self.hot_paths.discard(path)
+                self.cold_paths.append(path)
+
     def check_reload(self, paths):
         changes = set()
-        for path in paths:
-            mtime = get_mtime(path)
-            if path not in self.mtimes:
-                self.mtimes[path] = mtime
-            elif self.mtimes[path] < mtime:
-                self.mtimes[path] = mtime
+        for path, mtime in self.scan(paths):
+            last_mtime = self.mtimes.get(path)
+            self.mtimes[path] = mtime
+            # compare for inequality to catch files that were deleted or
+            # (re)created since the last scan
+            if last_mtime is not None and last_mtime != mtime:
                 changes.add(path)
         for path in sorted(changes):
             self.callback(path)
 
+    def scan(self, paths):
+        """Yield ``(path, mtime)`` for each path, one folder at a time."""
+        folders = group_by_folder(paths)
+        if self.max_workers and self.max_workers > 1 and len(folders) > 1:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix='hupper-poll'
+                )
+            shards = shard_folders(folders, self.max_workers)
+            for results in self.executor.map(self.scan_shard, shards):
+                yield from results
+        else:
+            yield from self.scan_folders(folders)
+
+    def scan_shard(self, folders):
+        return list(self.scan_folders(folders))
+
+    def scan_folders(self, folders):
+        for dirpath, names in folders.items():
+            if len(names) < self.scandir_threshold:
+                for name in names:
+                    self.throttle.wait()
+                    path = os.path.join(dirpath, name)
+                    yield path, get_mtime(path)
+            else:
+                yield from scan_folder(dirpath, names, self.throttle)
+
+
+class Throttle:
+    """Pace calls to :meth:`wait` to at most ``rate`` calls per second."""
+
+    def __init__(self, rate=None):
+        self.delay = 1.0 / rate if rate else 0
+        self.next_call = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.delay:
+            return
+        with self.lock:
+            now = time.monotonic()
+            due = max(self.next_call, now)
+            self.next_call = due + self.delay
+        if due > now:
+            time.sleep(due - now)
+
+
+def group_by_folder(paths):
+    folders = {}
+    for path in paths:
+        dirpath, name = os.path.split(path)
+        folders.setdefault(dirpath, set()).add(name)
+    return folders
+
+
+def shard_folders(folders, count):
+    """Split ``folders`` into ``count`` groups with similar file counts."""
+    shards = [{} for _ in range(count)]
+    sizes = [0] * count
+    for dirpath in sorted(folders, key=lambda k: -len(folders[k])):
+        idx = sizes.index(min(sizes))
+        shards[idx][dirpath] = folders[dirpath]
+        sizes[idx] += len(folders[dirpath])
+    return [shard for shard in shards if shard]
+
+
+def scan_folder(dirpath, names, throttle):
+    """
+    Return a list of ``(path, mtime)`` for the ``names`` in ``dirpath``.
+
+    Names that are missing from the folder are reported with an mtime of
+    ``0``.
+
+    """
+    mtimes = dict.fromkeys(names, 0)
+    if WIN or os.stat not in os.supports_dir_fd:  # pragma: no cover
+        # the directory listing includes the stat data on windows
+        try:
+            with os.scandir(dirpath or os.curdir) as it:
+                for entry in it:
+                    if entry.name in mtimes:
+                        throttle.wait()
+                        try:
+                            mtimes[entry.name] = entry.stat().st_mtime
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+
+    else:
+        # a scandir pass would list every entry in the folder and then stat
+        # each file anyway so stat the names relative to the folder instead
+        try:
+            dir_fd = os.open(dirpath or os.curdir, os.O_RDONLY)
+        except OSError:
+            dir_fd = None
+        if dir_fd is not None:
+            try:
+                for name in names:
+                    throttle.wait()
+                    try:
+                        mtimes[name] = os.stat(name, dir_fd=dir_fd).st_mtime
+                    except OSError:
+                        pass
+            finally:
+                os.close(dir_fd)
+    return [
+        (os.path.join(dirpath, name), mtime) for name, mtime in mtimes.items()
+    ]
+
 
 def get_mtime(path):
     try:
@@ -0,0 +1,146 @@
+import selectors
+import socket
+import threading
+import time
+
+from .utils import bind_socket, parse_address
+
+
+class TCPProxy:
+    """
+    Forward connections made to the ``listen`` address to the ``target``
+    address on which the worker listens.
+
+    While the worker is restarting, between :meth:`hold` and :meth:`release`,
+    new connections are held open instead of being forwarded. Afterwards
+    they are forwarded as soon as the new worker accepts connections, as
+    long as it does so within ``hold_timeout`` seconds.
+
+    """
+
+    buffer_size = 64 * 1024
+    retry_interval = 0.05
+
+    def __init__(self, listen, target, logger, hold_timeout=30):
+        self.listen = listen
+        self.target = target
+        self.target_family, self.target_address = parse_address(target)
+        self.logger = logger
+        self.hold_timeout = hold_timeout
+        self.released = threading.Event()
+        self.released.set()
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.sock = None
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        self.sock = bind_socket(self.listen)
+        self.thread = threading.Thread(target=self._accept_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.released.set()
+        with self.lock:
+            connections = list(self.connections)
+        for sock in [self.sock] + connections:
+            try:
+                # wake up any thread blocked on the socket
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.sock.close()
+
+    def join(self):
+        self.thread.join()
+
+    def hold(self):
+        """Hold new connections until :meth:`release` is invoked."""
+        self.released.clear()
+
+    def release(self):
+        """Forward connections as soon as the target accepts them."""
+        self.released.set()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                if self.stopped:
+                    return
+                continue
+            if client.family != getattr(socket, 'AF_UNIX', None):
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            handler = threading.Thread(target=self._handle, args=(client,))
+            handler.daemon = True
+            handler.start()
+
+    def _handle(self, client):
+        with self.lock:
+            self.connections.add(client)
+        try:
+            upstream = self._connect()
+            if upstream is None:
+                if not self.stopped:
+                    self.logger.error(
+                        'Timed out waiting for the worker to accept'
+                        ' connections on {}.'.format(self.target)
+                    )
+                return
+            with self.lock:
+                self.connections.add(upstream)
+            try:
+                self._pump(client, upstream)
+            finally:
+                with self.lock:
+                    self.connections.discard(upstream)
+                upstream.close()
+        finally:
+            with self.lock:
+                self.connections.discard(client)
+            client.close()
+
+    def _connect(self):
+        deadline = time.monotonic() + self.hold_timeout
+        while not self.stopped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.released.wait(remaining):
+                return None
+            sock = socket.socket(self.target_family, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.target_address)
+            except OSError:
+                # the worker is not listening yet
+                sock.close()
+                time.sleep(self.retry_interval)
+                continue
+            if self.target_family != getattr(socket, 'AF_UNIX', None):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return sock
+        return None
+
+    def _pump(self, client, upstream):
+        peers = {client: upstream, upstream: client}
+        buf = bytearray(self.buffer_size)
+        view = memoryview(buf)
+        with selectors.DefaultSelector() as selector:
+            for sock in peers:
+                selector.register(sock, selectors.EVENT_READ)
+            while selector.get_map():
+                for key, _ in selector.select():
+                    sock = key.fileobj
+                    peer = peers[sock]
+                    try:
+                        n = sock.recv_into(buf)
+                        if n:
+                            peer.sendall(view[:n])
+                            continue
+                        # forward the half-close and wait for the other side
+                        selector.unregister(sock)
+                        peer.shutdown(socket.SHUT_WR)
+                    except OSError:
+                        return
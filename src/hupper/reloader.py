@@ -2,9 +2,14 @@ from collections import deque
 from contextlib import contextmanager
 import fnmatch
 from glob import glob
+import hashlib
+import json
 import os
+import queue
 import re
+import select
 import signal
+import socket
 import sys
 import threading
 import time
@@ -13,7 +18,10 @@ from .ipc import ProcessGroup, close_fd
 from .logger import DefaultLogger, SilentLogger
 from .utils import (
     WIN,
+    bind_socket,
     default,
+    is_forkserver_supported,
+    is_inotify_supported,
     is_stream_interactive,
     is_watchdog_supported,
     is_watchman_supported,
@@ -31,14 +39,49 @@ class FileMonitorProxy:
     exposes a thread-safe interface back to the reloader to detect
     when it should reload.
 
+    ``verifier`` is an optional :class:`.ChangeVerifier` used to drop
+    events for files whose contents did not actually change.
+
+    ``quiescence`` is an optional :class:`.VCSQuiescence` used to hold
+    changes while a version control operation is rewriting the tree.
+
+    ``settle_interval`` is a value in seconds to wait for further changes
+    after a file changes, such that a burst of changes results in a single
+    reload. The reload is triggered once no file has changed for
+    ``settle_interval`` seconds or ``max_settle_interval`` seconds after the
+    first change. Default is ``0`` which reloads immediately.
+
     """
 
     monitor = None
 
-    def __init__(self, callback, logger, ignore_files=None):
+    def __init__(
+        self,
+        callback,
+        logger,
+        ignore_files=None,
+        verifier=None,
+        quiescence=None,
+        settle_interval=0,
+        max_settle_interval=None,
+    ):
         self.callback = callback
         self.logger = logger
+        self.verifier = verifier
+        self.quiescence = quiescence
+        self.settle_interval = settle_interval
+        if max_settle_interval is None:
+            max_settle_interval = settle_interval * 5
+        self.max_settle_interval = max(max_settle_interval, settle_interval)
+        self.last_change = None
+        self.settler = None
+        self.paths = set()
+        self.restored_paths = set()
+        # restored paths which no worker asked for
+        self.stale_paths = set()
         self.changed_paths = set()
+        # the number of change events seen for each path
+        self.generations = {}
         self.ignore_files = [
             re.compile(fnmatch.translate(x)) for x in set(ignore_files or [])
         ]
@@ -46,12 +89,53 @@ class FileMonitorProxy:
         self.is_changed = False
 
     def add_path(self, path):
+        """Start monitoring a path, returning the list of files added."""
+        paths = []
         # if the glob does not match any files then go ahead and pass
         # the pattern to the monitor anyway incase it is just a file that
         # is currently missing
         for p in glob(path, recursive=True) or [path]:
             if not any(x.match(p) for x in self.ignore_files):
+                paths.append(p)
+                self.paths.add(p)
+                if self.verifier is not None:
+                    self.verifier.track(p)
+                if self.quiescence is not None:
+                    self.quiescence.track(p)
                 self.monitor.add_path(p)
+        return paths
+
+    def restore_path(self, path, signature=None, digest=None):
+        """
+        Start monitoring a path remembered from a previous run.
+
+        Unlike :meth:`add_path` the path is not recorded as part of the
+        current watch set until a worker asks for it again, see
+        :meth:`forget_restored_paths`.
+
+        """
+        if any(x.match(path) for x in self.ignore_files):
+            return
+        with self.lock:
+            self.restored_paths.add(path)
+        if self.verifier is not None:
+            self.verifier.restore(path, signature, digest)
+        self.monitor.add_path(path)
+
+    def forget_restored_paths(self):
+        """
+        Ignore changes to restored paths which were not added again, once
+        the workers have reported the files they use.
+
+        """
+        with self.lock:
+            self.stale_paths = self.restored_paths - self.paths
+            self.restored_paths = set()
+        if self.stale_paths:
+            self.logger.debug(
+                'Ignoring {} restored paths which are no longer'
+                ' used.'.format(len(self.stale_paths))
+            )
 
     def start(self):
         self.monitor.start()
@@ -61,19 +145,417 @@ class FileMonitorProxy:
         self.monitor.join()
 
     def file_changed(self, path):
+        # the monitor cannot stop watching a path so changes to files which
+        # are no longer used are dropped here
+        if path in self.stale_paths and path not in self.paths:
+            return
+
+        # verify outside of the lock because it may need to read the file
+        if self.verifier is not None and not self.verifier.is_changed(path):
+            self.logger.debug(
+                '{} was touched but its contents did not change.'.format(path)
+            )
+            return
+
+        if self.quiescence is not None and self.quiescence.hold(
+            path, self._record_change
+        ):
+            return
+
+        self._record_change(path)
+
+    def _record_change(self, path):
         with self.lock:
-            if path not in self.changed_paths:
-                self.logger.info('{} changed; reloading ...'.format(path))
-                self.changed_paths.add(path)
+            # every event extends the quiet period, including another write
+            # to a file which already changed
+            self.last_change = time.monotonic()
+            self.generations[path] = self.generations.get(path, 0) + 1
+            if path in self.changed_paths:
+                return
+
+            self.logger.info('{} changed; reloading ...'.format(path))
+            self.changed_paths.add(path)
+
+            if self.is_changed:
+                return
+
+            if not self.settle_interval:
+                self.is_changed = True
+                self.callback(self.changed_paths)
+
+            elif self.settler is None:
+                self.settler = threading.Thread(
+                    target=self._settle, args=(self.last_change,)
+                )
+                self.settler.daemon = True
+                self.settler.start()
 
-                if not self.is_changed:
+    def _settle(self, first_change):
+        deadline = first_change + self.max_settle_interval
+        while True:
+            with self.lock:
+                if not self.changed_paths:
+                    # the changes were cleared by a restart meanwhile
+                    self.settler = None
+                    return
+                now = time.monotonic()
+                delay = (
+                    min(self.last_change + self.settle_interval, deadline)
+                    - now
+                )
+                if delay <= 0:
+                    self.settler = None
                     self.is_changed = True
+                    if len(self.changed_paths) > 1:
+                        self.logger.debug(
+                            'Collected changes to {} files.'.format(
+                                len(self.changed_paths)
+                            )
+                        )
                     self.callback(self.changed_paths)
+                    return
+            time.sleep(delay)
+
+    def get_changes(self):
+        """
+        Return a dict mapping each changed path to its generation, for
+        :meth:`clear_changes`.
 
-    def clear_changes(self):
+        """
         with self.lock:
-            self.changed_paths = set()
+            return {
+                path: self.generations[path] for path in self.changed_paths
+            }
+
+    def clear_changes(self, changes=None):
+        """
+        Forget the ``changes`` returned by :meth:`get_changes`, or all of
+        them by default. If files changed again meanwhile then the callback
+        is invoked again.
+
+        """
+        with self.lock:
+            if changes is None:
+                self.changed_paths = set()
+            else:
+                self.changed_paths = {
+                    path
+                    for path in self.changed_paths
+                    if changes.get(path) != self.generations[path]
+                }
             self.is_changed = False
+            if self.changed_paths and self.settler is None:
+                self.is_changed = True
+                self.callback(self.changed_paths)
+
+
+class ChangeVerifier:
+    """
+    Decide whether a file reported by a monitor was really modified.
+
+    A cheap ``(size, mtime_ns, inode)`` signature is compared first and only
+    if it differs is the content hashed and compared to the digest of the
+    previous version. Baseline digests are computed lazily on a background
+    thread after a path is tracked and are cached per path.
+
+    """
+
+    def __init__(self):
+        self.signatures = {}
+        self.digests = {}
+        self.lock = threading.Lock()
+        self.pending = queue.Queue()
+        self.hasher = None
+
+    def restore(self, path, signature, digest):
+        """Seed a digest computed by a previous run if it is still valid."""
+        current = get_file_signature(path)
+        with self.lock:
+            if path in self.signatures:
+                return
+            self.signatures[path] = current
+            if current is not None and current == signature and digest:
+                self.digests[path] = (current, digest)
+        if current is not None and path not in self.digests:
+            self.track_digest(path)
+
+    def track(self, path):
+        with self.lock:
+            if path in self.signatures:
+                return
+            self.signatures[path] = get_file_signature(path)
+        self.track_digest(path)
+
+    def track_digest(self, path):
+        with self.lock:
+            if self.hasher is None:
+                self.hasher = threading.Thread(target=self._hash_pending)
+                self.hasher.daemon = True
+                self.hasher.start()
+        self.pending.put(path)
+
+    def get_fingerprint(self, path):
+        """Return the last known ``(signature, digest)`` of a path."""
+        with self.lock:
+            signature = self.signatures.get(path)
+            digest = self.digests.get(path)
+        if digest is None or digest[0] != signature:
+            return signature, None
+        return signature, digest[1]
+
+    def is_changed(self, path):
+        signature = get_file_signature(path)
+        with self.lock:
+            old_signature = self.signatures.get(path)
+            old_digest = self.digests.get(path)
+            if signature == old_signature:
+                return False
+            self.signatures[path] = signature
+
+        if signature is None:
+            # the file was deleted
+            with self.lock:
+                self.digests.pop(path, None)
+            return True
+
+        digest = get_file_digest(path, signature)
+        with self.lock:
+            if digest is not None:
+                self.digests[path] = (signature, digest)
+            else:
+                self.digests.pop(path, None)
+
+        # the baseline digest is only trustworthy if it was computed from
+        # the version of the file that the old signature describes
+        if old_digest is None or old_digest[0] != old_signature:
+            return True
+        return digest is None or digest != old_digest[1]
+
+    def _hash_pending(self):
+        while True:
+            path = self.pending.get()
+            with self.lock:
+                signature = self.signatures.get(path)
+                if signature is None or path in self.digests:
+                    continue
+            digest = get_file_digest(path, signature)
+            if digest is not None:
+                with self.lock:
+                    if self.signatures.get(path) == signature:
+                        self.digests.setdefault(path, (signature, digest))
+
+
+class VCSQuiescence:
+    """
+    Hold file changes while a version control operation, such as a
+    ``git checkout`` or ``hg update``, is rewriting the working copy and
+    release them together once it finishes.
+
+    An operation is considered to be in progress while one of the
+    :attr:`lock_files` exists in a repository containing a watched file.
+    Lock files older than ``stale_after`` seconds are assumed to have been
+    left behind by a crashed process and are ignored. Changes are never held
+    for longer than ``max_hold`` seconds.
+
+    """
+
+    lock_files = {
+        '.git': ('index.lock',),
+        '.hg': ('wlock', os.path.join('store', 'lock')),
+    }
+
+    def __init__(
+        self, logger, poll_interval=0.1, max_hold=60, stale_after=300
+    ):
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self.max_hold = max_hold
+        self.stale_after = stale_after
+        self.lock_paths = set()
+        self.repos = {}
+        self.held = []
+        self.waiter = None
+        self.lock = threading.Lock()
+
+    def track(self, path):
+        """Watch the lock files of the repository containing ``path``."""
+        dirpath = os.path.dirname(os.path.abspath(path))
+        visited = []
+        while dirpath not in self.repos:
+            visited.append(dirpath)
+            lock_paths = find_vcs_lock_paths(dirpath, self.lock_files)
+            parent = os.path.dirname(dirpath)
+            if lock_paths is not None or parent == dirpath:
+                self.repos[dirpath] = lock_paths
+                break
+            dirpath = parent
+        lock_paths = self.repos[dirpath]
+        for dirpath in visited:
+            self.repos[dirpath] = lock_paths
+        if lock_paths:
+            with self.lock:
+                self.lock_paths.update(lock_paths)
+
+    def is_busy(self):
+        with self.lock:
+            lock_paths = list(self.lock_paths)
+        now = time.time()
+        for path in lock_paths:
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if now - mtime < self.stale_after:
+                return True
+        return False
+
+    def hold(self, path, release):
+        """
+        Return ``True`` if the change to ``path`` is held, in which case
+        ``release`` is invoked with the path after the operation finishes.
+
+        """
+        with self.lock:
+            if self.waiter is not None:
+                self.held.append(path)
+                return True
+        if not self.is_busy():
+            return False
+        with self.lock:
+            self.held.append(path)
+            if self.waiter is None:
+                self.logger.info(
+                    '{} changed while a version control operation is in'
+                    ' progress, waiting for it to finish ...'.format(path)
+                )
+                self.waiter = threading.Thread(
+                    target=self._wait, args=(release,)
+                )
+                self.waiter.daemon = True
+                self.waiter.start()
+        return True
+
+    def _wait(self, release):
+        deadline = time.monotonic() + self.max_hold
+        while self.is_busy():
+            if time.monotonic() > deadline:
+                self.logger.info(
+                    'Gave up waiting for the version control operation to'
+                    ' finish after {} seconds.'.format(self.max_hold)
+                )
+                break
+            time.sleep(self.poll_interval)
+        with self.lock:
+            held, self.held = self.held, []
+            self.waiter = None
+        for path in held:
+            release(path)
+
+
+def find_vcs_lock_paths(dirpath, lock_files):
+    """
+    Return the lock files of a repository rooted at ``dirpath`` or ``None``
+    if it is not the root of a repository.
+
+    """
+    for name, files in lock_files.items():
+        metapath = os.path.join(dirpath, name)
+        if os.path.isfile(metapath):
+            # git worktrees and submodules point at the real git folder
+            try:
+                with open(metapath, 'r') as fp:
+                    line = fp.readline().strip()
+            except OSError:
+                continue
+            if not line.startswith('gitdir:'):
+                continue
+            metapath = os.path.join(dirpath, line[len('gitdir:') :].strip())
+        elif not os.path.isdir(metapath):
+            continue
+        return [os.path.join(metapath, f) for f in files]
+    return None
+
+
+def get_file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def get_file_digest(path, signature):
+    """
+    Return a hash of the file contents or ``None`` if the file does not
+    match ``signature`` by the time it has been read.
+
+    """
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(65536), b''):
+                h.update(chunk)
+    except OSError:
+        return None
+    if get_file_signature(path) != signature:
+        return None
+    return h.digest()
+
+
+class WatchManifest:
+    """
+    Persist the set of watched files, and their fingerprints, between runs
+    of the reloader so that they can be monitored before the worker has
+    finished importing the app.
+
+    """
+
+    version = 1
+
+    def __init__(self, path, logger):
+        self.path = path
+        self.logger = logger
+
+    def load(self):
+        """Return a dict of ``path -> (signature, digest)``."""
+        try:
+            with open(self.path, 'r') as fp:
+                data = json.load(fp)
+            if data.get('version') != self.version:
+                return {}
+            entries = {}
+            for path, (signature, digest) in data['files'].items():
+                if signature is not None:
+                    signature = tuple(signature)
+                if digest is not None:
+                    digest = bytes.fromhex(digest)
+                entries[path] = (signature, digest)
+            return entries
+        except FileNotFoundError:
+            return {}
+        except Exception as ex:
+            self.logger.error(
+                'Ignoring invalid watch manifest {}: {}'.format(self.path, ex)
+            )
+            return {}
+
+    def save(self, entries):
+        files = {}
+        for path, (signature, digest) in entries.items():
+            files[path] = [signature, digest.hex() if digest else None]
+        data = {'version': self.version, 'files': files}
+        tmp_path = self.path + '.tmp'
+        try:
+            dirpath = os.path.dirname(self.path)
+            if dirpath:
+                os.makedirs(dirpath, exist_ok=True)
+            with open(tmp_path, 'w') as fp:
+                json.dump(data, fp)
+            os.replace(tmp_path, self.path)
+        except OSError as ex:
+            self.logger.error(
+                'Failed to save watch manifest {}: {}'.format(self.path, ex)
+            )
 
 
 class ControlSignal:
@@ -85,6 +567,7 @@ class ControlSignal:
     SIGCHLD = byte(4)
     FILE_CHANGED = byte(10)
     WORKER_COMMAND = byte(11)
+    WAKEUP = byte(12)
 
     del byte
 
@@ -100,13 +583,124 @@ class WorkerResult:
     WAIT = 'wait'
 
 
+class RestartPolicy:
+    """
+    Throttle restarts of a worker which keeps failing shortly after it
+    starts.
+
+    A run is a failure if the worker exits or is restarted with a non-zero
+    exit code within ``min_uptime`` seconds and no file changed. Each
+    consecutive failure doubles the delay before the next restart, starting
+    at ``reload_interval`` and capped at ``max_backoff`` seconds. After
+    ``max_failures`` consecutive failures the circuit breaker opens and the
+    reloader waits for a file to change before starting another worker.
+
+    """
+
+    def __init__(
+        self,
+        logger,
+        reload_interval=1,
+        min_uptime=5,
+        max_backoff=30,
+        max_failures=5,
+    ):
+        self.logger = logger
+        self.reload_interval = reload_interval
+        self.min_uptime = min_uptime
+        self.max_backoff = max(max_backoff, reload_interval)
+        self.max_failures = max_failures
+        self.failures = 0
+
+    def decide(self, result, exitcode, uptime, is_changed):
+        """
+        Return a tuple of ``(result, delay)`` where ``delay`` is the number
+        of seconds to wait before starting the next worker.
+
+        """
+        if result == WorkerResult.EXIT:
+            return result, 0
+
+        if is_changed or uptime >= self.min_uptime or not exitcode:
+            self.reset()
+            return result, self.reload_interval
+
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            if result != WorkerResult.WAIT:
+                self.logger.info(
+                    'Worker failed {} times in a row, waiting for a file to'
+                    ' change before restarting.'.format(self.failures)
+                )
+            return WorkerResult.WAIT, self.reload_interval
+
+        delay = min(
+            self.reload_interval * 2 ** (self.failures - 1), self.max_backoff
+        )
+        if result == WorkerResult.RELOAD:
+            self.logger.info(
+                'Worker exited with code {} after {:.1f} seconds, restarting'
+                ' in {:.1f} seconds.'.format(exitcode, uptime, delay)
+            )
+        return result, delay
+
+    def reset(self):
+        if self.failures:
+            self.logger.debug('Resetting the restart backoff.')
+        self.failures = 0
+
+
 class Reloader:
     """
     A wrapper class around a file monitor which will handle changes by
     restarting a new worker process.
 
+    ``restart_policy`` is an optional :class:`.RestartPolicy` used to slow
+    down restarts of a worker that keeps failing. By default one is created
+    using the ``reload_interval``.
+
+    ``standby`` keeps the next worker process spawned ahead of time with the
+    third-party modules imported by the previous worker already loaded,
+    such that a reload only needs to import the project code.
+
+    ``fork_server`` forks each worker from a zygote process which has
+    imported the third-party modules used by the previous worker, instead
+    of spawning a new interpreter. It is only supported on Linux and takes
+    precedence over ``standby``.
+
+    ``bind`` is an optional list of addresses on which the reloader listens
+    once, sharing the sockets with every worker.
+
+    ``proxy`` is an optional tuple of ``(listen, target)`` addresses. The
+    reloader forwards connections made to ``listen`` to ``target``, on which
+    the worker listens, and holds them while the worker restarts.
+
+    ``workers`` is the number of copies of the worker to run. With more than
+    one, a change restarts them one at a time, waiting up to
+    ``ready_timeout`` seconds for each new worker to invoke
+    :meth:`hupper.interfaces.IReloaderProxy.ready` before moving on to the
+    next one, and a worker that exits is restarted on its own.
+
+    ``services`` is an optional dict mapping names to worker specs, each
+    either a ``worker_path`` or a tuple of ``(worker_path, worker_args,
+    worker_kwargs)``, which replace the single worker. ``workers`` copies of
+    each are run, sharing the file monitor, and a change only restarts the
+    services which asked to watch the changed file.
+
+    ``hot_reload`` sends the changed files to the worker, which reloads the
+    modules in place if they are marked as reload-safe, instead of starting
+    a new worker. It does not apply to ``workers`` or ``services``.
+
+    ``blue_green`` keeps the current worker running while the next one is
+    starting up, until the next one invokes
+    :meth:`hupper.interfaces.IReloaderProxy.ready` or ``ready_timeout``
+    seconds pass. If the next worker exits before it is ready then the
+    current worker is kept.
+
     """
 
+    ready_timeout = 10
+
     def __init__(
         self,
         worker_path,
@@ -117,15 +711,52 @@ class Reloader:
         worker_args=None,
         worker_kwargs=None,
         ignore_files=None,
+        verify_changes=False,
+        wait_for_vcs=False,
+        watch_manifest=None,
+        settle_interval=0,
+        max_settle_interval=None,
+        restart_policy=None,
+        standby=False,
+        fork_server=False,
+        blue_green=False,
+        bind=None,
+        proxy=None,
+        workers=1,
+        services=None,
+        hot_reload=False,
     ):
         self.worker_path = worker_path
         self.worker_args = worker_args
         self.worker_kwargs = worker_kwargs
         self.ignore_files = ignore_files
+        self.verify_changes = verify_changes
+        self.wait_for_vcs = wait_for_vcs
+        self.watch_manifest = watch_manifest
+        self.settle_interval = settle_interval
+        self.max_settle_interval = max_settle_interval
         self.monitor_factory = monitor_factory
         self.reload_interval = reload_interval
         self.shutdown_interval = shutdown_interval
         self.logger = logger
+        if restart_policy is None:
+            restart_policy = RestartPolicy(logger, reload_interval)
+        self.restart_policy = restart_policy
+        self.standby = standby
+        self.standby_worker = None
+        self.standby_paths = set()
+        self.system_modules = {}
+        self.fork_server = fork_server
+        self.zygote = None
+        self.blue_green = blue_green
+        self.handoff_worker = None
+        self.bind = bind or []
+        self.sockets = []
+        self.proxy = proxy
+        self.tcp_proxy = None
+        self.workers = workers
+        self.services = services or {}
+        self.hot_reload = hot_reload
         self.monitor = None
         self.process_group = ProcessGroup()
 
@@ -141,15 +772,24 @@ class Reloader:
         exitcode = -1
         with self._setup_runtime():
             while True:
+                start = time.time()
                 result, exitcode = self._run_worker()
                 if result == WorkerResult.EXIT:
                     break
+                result, interval = self.restart_policy.decide(
+                    result,
+                    exitcode,
+                    time.time() - start,
+                    self.monitor.is_changed,
+                )
                 start = time.time()
                 if result == WorkerResult.WAIT:
                     result, _ = self._wait_for_changes()
                     if result == WorkerResult.EXIT:
                         break
-                dt = self.reload_interval - (time.time() - start)
+                    # a file changed or the user asked for a reload
+                    self.restart_policy.reset()
+                dt = interval - (time.time() - start)
                 if dt > 0:
                     time.sleep(dt)
         sys.exit(exitcode)
@@ -168,26 +808,221 @@ class Reloader:
             return exitcode
 
     def _run_worker(self):
-        worker = Worker(
-            self.worker_path, args=self.worker_args, kwargs=self.worker_kwargs
+        if self.workers > 1 or self.services:
+            try:
+                return _run_pool(self)
+            finally:
+                self._save_manifest()
+
+        previous, self.handoff_worker = self.handoff_worker, None
+        worker = self._take_standby()
+        if worker is None:
+            worker = self._make_worker()
+        if self.standby and self.zygote is None:
+            self._spawn_standby()
+        try:
+            return _run_worker(
+                self, worker, previous=previous, hot_reload=self.hot_reload
+            )
+        finally:
+            # the worker reported the rest of its paths before exiting
+            self.monitor.forget_restored_paths()
+            self._save_manifest()
+
+    def _make_worker(self, spec=None):
+        if spec is None:
+            spec = (self.worker_path, self.worker_args, self.worker_kwargs)
+        worker_path, worker_args, worker_kwargs = spec
+        return Worker(
+            worker_path,
+            args=worker_args,
+            kwargs=worker_kwargs,
+            forkserver=self._prepare_fork_server(),
+            sockets=self.sockets,
+            report_modules=self.standby or self.zygote is not None,
         )
-        return _run_worker(self, worker)
 
-    def _wait_for_changes(self):
-        worker = Worker(__name__ + '.wait_main')
-        return _run_worker(
-            self,
-            worker,
-            logger=SilentLogger(),
-            shutdown_interval=0,
+    def _prepare_fork_server(self):
+        zygote = self.zygote
+        if zygote is None:
+            return None
+        if zygote.process is not None:
+            stale = zygote.paths & set(self.monitor.changed_paths)
+            if stale:
+                self.logger.info(
+                    'Restarting the fork server because {} changed.'.format(
+                        ', '.join(sorted(stale))
+                    )
+                )
+                zygote.stop()
+            elif not zygote.is_alive:
+                self.logger.info('Restarting the fork server.')
+                zygote.stop()
+        if zygote.process is None:
+            zygote.start(self.system_modules)
+        return zygote
+
+    @contextmanager
+    def _start_fork_server(self):
+        if self.fork_server:
+            if is_forkserver_supported():
+                from .forkserver import ForkServer
+
+                self.zygote = ForkServer(
+                    self.logger,
+                    on_exit=self._control_proxy(ControlSignal.SIGCHLD),
+                )
+            else:
+                self.logger.error(
+                    'The fork server is not supported on this platform,'
+                    ' spawning workers instead.'
+                )
+        try:
+            yield
+        finally:
+            zygote, self.zygote = self.zygote, None
+            if zygote is not None:
+                zygote.stop()
+
+    def _spawn_standby(self):
+        worker = self._make_worker()
+        try:
+            worker.prespawn(preload=sorted(self.system_modules))
+        except Exception as ex:  # pragma: no cover
+            self.logger.error('Failed to spawn a standby worker: ' + str(ex))
+            worker.discard()
+            return
+        self.logger.debug(
+            'Spawned standby worker PID {} preloading {} modules.'.format(
+                worker.pid, len(self.system_modules)
+            )
         )
+        self.standby_worker = worker
+        self.standby_paths = set(self.system_modules.values())
+
+    def _take_standby(self):
+        worker, self.standby_worker = self.standby_worker, None
+        if worker is None:
+            return None
+        stale = self.standby_paths & set(self.monitor.changed_paths)
+        if stale:
+            self.logger.info(
+                'Discarding the standby worker because {} changed.'.format(
+                    ', '.join(sorted(stale))
+                )
+            )
+            worker.discard()
+            return None
+        if not worker.is_alive:
+            self.logger.debug('Standby worker exited unexpectedly.')
+            worker.discard()
+            return None
+        return worker
+
+    @contextmanager
+    def _manage_workers(self):
+        try:
+            yield
+        finally:
+            worker, self.standby_worker = self.standby_worker, None
+            if worker is not None:
+                worker.discard()
+            worker, self.handoff_worker = self.handoff_worker, None
+            if worker is not None:
+                _stop_workers([worker], self.logger, self.shutdown_interval)
+
+    def _wait_for_changes(self):
+        if WIN:  # pragma: no cover
+            # select only supports sockets on windows so wait for the
+            # console in a separate process instead
+            worker = Worker(__name__ + '.wait_main')
+            return _run_worker(
+                self,
+                worker,
+                logger=SilentLogger(),
+                shutdown_interval=0,
+            )
+
+        if self.monitor.is_changed:
+            # a file changed after the last worker consumed the signal and
+            # the monitor does not signal again until the changes are cleared
+            return WorkerResult.RELOAD, None
+
+        fds = [self.control_r]
+        if is_stream_interactive(sys.stdin):
+            print('Press ENTER or change a file to reload.', flush=True)
+            fds.append(sys.stdin.fileno())
+        else:
+            print('Waiting for a file to change before reload.', flush=True)
+
+        while True:
+            readable, _, _ = select.select(fds, [], [])
+            if self.control_r not in readable:
+                if sys.stdin.readline():
+                    return WorkerResult.RELOAD, None
+                # stdin was closed, keep waiting for a file to change
+                fds.remove(sys.stdin.fileno())
+                continue
+
+            signal = os.read(self.control_r, 1)
+
+            if not signal:
+                self.logger.error('Control pipe died unexpectedly.')
+                return WorkerResult.EXIT, None
+
+            elif signal in (ControlSignal.SIGINT, ControlSignal.SIGTERM):
+                return WorkerResult.EXIT, None
+
+            elif signal == ControlSignal.SIGHUP:
+                return WorkerResult.RELOAD, None
+
+            elif signal == ControlSignal.FILE_CHANGED:
+                if self.monitor.is_changed:
+                    return WorkerResult.RELOAD, None
 
     @contextmanager
     def _setup_runtime(self):
         with self._start_control():
-            with self._start_monitor():
-                with self._capture_signals():
-                    yield
+            with self._bind_sockets(), self._start_proxy():
+                with self._start_monitor():
+                    with self._capture_signals():
+                        with self._start_fork_server():
+                            with self._manage_workers():
+                                yield
+
+    @contextmanager
+    def _bind_sockets(self):
+        try:
+            for address in self.bind:
+                self.sockets.append(bind_socket(address))
+                self.logger.info('Listening on {}.'.format(address))
+            yield
+        finally:
+            sockets, self.sockets = self.sockets, []
+            for sock in sockets:
+                if sock.family == getattr(socket, 'AF_UNIX', None):
+                    try:
+                        os.unlink(sock.getsockname())
+                    except OSError:  # pragma: no cover
+                        pass
+                sock.close()
+
+    @contextmanager
+    def _start_proxy(self):
+        if self.proxy:
+            from .proxy import TCPProxy
+
+            listen, target = self.proxy
+            self.tcp_proxy = TCPProxy(listen, target, self.logger)
+            self.tcp_proxy.start()
+            self.logger.info('Proxying {} to {}.'.format(listen, target))
+        try:
+            yield
+        finally:
+            tcp_proxy, self.tcp_proxy = self.tcp_proxy, None
+            if tcp_proxy is not None:
+                tcp_proxy.stop()
+                tcp_proxy.join()
 
     @contextmanager
     def _start_control(self):
@@ -208,6 +1043,12 @@ class Reloader:
             self._control_proxy(ControlSignal.FILE_CHANGED),
             self.logger,
             self.ignore_files,
+            verifier=ChangeVerifier() if self.verify_changes else None,
+            quiescence=(
+                VCSQuiescence(self.logger) if self.wait_for_vcs else None
+            ),
+            settle_interval=self.settle_interval,
+            max_settle_interval=self.max_settle_interval,
         )
         proxy.monitor = self.monitor_factory(
             proxy.file_changed,
@@ -216,12 +1057,53 @@ class Reloader:
         )
         self.monitor = proxy
         self.monitor.start()
+        restore_timer = self._restore_manifest()
         try:
             yield
         finally:
+            if restore_timer is not None:
+                restore_timer.cancel()
             self.monitor = None
             proxy.stop()
 
+    def _restore_manifest(self):
+        if not self.watch_manifest:
+            return
+        entries = WatchManifest(self.watch_manifest, self.logger).load()
+        changed = 0
+        for path, (signature, digest) in entries.items():
+            if get_file_signature(path) != signature:
+                self.logger.debug(
+                    '{} changed since the last run.'.format(path)
+                )
+                changed += 1
+            self.monitor.restore_path(path, signature, digest)
+        if entries:
+            self.logger.debug(
+                'Restored {} paths from the watch manifest, {} changed since'
+                ' the last run.'.format(len(entries), changed)
+            )
+            # by then the first worker has normally imported the app even
+            # if it never signals that it is ready
+            timer = threading.Timer(
+                self.ready_timeout, self.monitor.forget_restored_paths
+            )
+            timer.daemon = True
+            timer.start()
+            return timer
+
+    def _save_manifest(self):
+        if not self.watch_manifest or self.monitor is None:
+            return
+        verifier = self.monitor.verifier
+        entries = {}
+        for path in list(self.monitor.paths):
+            if verifier is not None:
+                entries[path] = verifier.get_fingerprint(path)
+            else:
+                entries[path] = (get_file_signature(path), None)
+        WatchManifest(self.watch_manifest, self.logger).save(entries)
+
     _signals = {
         'SIGINT': ControlSignal.SIGINT,
         'SIGHUP': ControlSignal.SIGHUP,
@@ -255,7 +1137,14 @@ class Reloader:
                 undo()
 
 
-def _run_worker(self, worker, logger=None, shutdown_interval=None):
+def _run_worker(
+    self,
+    worker,
+    logger=None,
+    shutdown_interval=None,
+    previous=None,
+    hot_reload=False,
+):
     if logger is None:
         logger = self.logger
 
@@ -264,15 +1153,37 @@ def _run_worker(self, worker, logger=None, shutdown_interval=None):
 
     packets = deque()
 
-    def handle_packet(packet):
-        packets.append(packet)
-        os.write(self.control_w, ControlSignal.WORKER_COMMAND)
+    def packet_handler(source):
+        def handle_packet(packet):
+            packets.append((source, packet))
+            os.write(self.control_w, ControlSignal.WORKER_COMMAND)
+
+        return handle_packet
 
     self.monitor.clear_changes()
 
-    worker.start(handle_packet)
+    worker.start(packet_handler(worker))
+    if previous is not None:
+        # the previous worker keeps serving until the new one is ready
+        previous.pipe.on_recv = packet_handler(previous)
     result = WorkerResult.WAIT
     soft_kill = True
+    handoff = False
+
+    # the changes sent to the worker to be reloaded in place
+    hot_paths = None
+
+    ready_timer = None
+    if previous is not None:
+        # do not keep the previous worker forever if the new one never
+        # signals that it is ready
+        ready_timer = threading.Timer(
+            self.ready_timeout,
+            os.write,
+            (self.control_w, ControlSignal.WAKEUP),
+        )
+        ready_timer.daemon = True
+        ready_timer.start()
 
     logger.info('Starting monitor for PID %s.' % worker.pid)
     try:
@@ -283,7 +1194,15 @@ def _run_worker(self, worker, logger=None, shutdown_interval=None):
             # process all packets before moving on to signals to avoid
             # missing any files that need to be watched
             if packets:
-                cmd = packets.popleft()
+                source, cmd = packets.popleft()
+
+                if source is not worker:
+                    # only keep tracking files for a previous worker, its
+                    # exit is handled via SIGCHLD
+                    if cmd is not None and cmd[0] == 'watch_files':
+                        for path in cmd[1]:
+                            self.monitor.add_path(path)
+                    continue
 
                 if cmd is None:
                     if worker.is_alive:
@@ -310,6 +1229,7 @@ def _run_worker(self, worker, logger=None, shutdown_interval=None):
                 logger.debug('Received worker command "{}".'.format(cmd[0]))
                 if cmd[0] == 'reload':
                     result = WorkerResult.RELOAD
+                    handoff = self.blue_green
                     break
 
                 elif cmd[0] == 'watch_files':
@@ -319,6 +1239,44 @@ def _run_worker(self, worker, logger=None, shutdown_interval=None):
                 elif cmd[0] == 'graceful_shutdown':
                     os.write(self.control_w, ControlSignal.SIGTERM)
 
+                elif cmd[0] == 'system_modules':
+                    self.system_modules.update(cmd[1])
+                    if self.zygote is not None:
+                        self.zygote.preload(cmd[1])
+                    if self.zygote is not None or self.standby:
+                        # restart the zygote, or discard the standby worker,
+                        # if a preloaded module changes
+                        for path in cmd[1].values():
+                            self.monitor.add_path(path)
+
+                elif cmd[0] == 'hot_reloaded':
+                    logger.info(
+                        'Reloaded {} in PID {}.'.format(
+                            ', '.join(cmd[1]), worker.pid
+                        )
+                    )
+                    self.monitor.clear_changes(hot_paths)
+                    hot_paths = None
+
+                elif cmd[0] == 'hot_reload_failed':
+                    logger.info(
+                        'Unable to reload in place because {}.'.format(cmd[1])
+                    )
+                    result = WorkerResult.RELOAD
+                    handoff = self.blue_green
+                    break
+
+                elif cmd[0] == 'ready':
+                    self.monitor.forget_restored_paths()
+                    if previous is not None:
+                        logger.info(
+                            'Worker PID {} is ready, stopping PID {}.'.format(
+                                worker.pid, previous.pid
+                            )
+                        )
+                        _stop_workers([previous], logger, shutdown_interval)
+                        previous = None
+
                 else:  # pragma: no cover
                     raise RuntimeError('received unknown control signal', cmd)
 
@@ -349,6 +1307,7 @@ def _run_worker(self, worker, logger=None, shutdown_interval=None):
             elif signal == ControlSignal.SIGHUP:
                 logger.info('Received SIGHUP, triggering a reload.')
                 result = WorkerResult.RELOAD
+                handoff = self.blue_green
                 break
 
             elif signal == ControlSignal.SIGTERM:
@@ -358,12 +1317,71 @@ def _run_worker(self, worker, logger=None, shutdown_interval=None):
 
             elif signal == ControlSignal.FILE_CHANGED:
                 if self.monitor.is_changed:
+                    if hot_reload and hot_paths is not None:
+                        # wait for the worker to finish reloading
+                        continue
+                    if hot_reload:
+                        hot_paths = self.monitor.get_changes()
+                        try:
+                            worker.pipe.send(('hot_reload', sorted(hot_paths)))
+                            continue
+                        except OSError:
+                            # the worker is gone, fallback to a restart
+                            pass
                     result = WorkerResult.RELOAD
+                    handoff = self.blue_green
                     break
 
+            elif signal == ControlSignal.WAKEUP:
+                if previous is not None:
+                    logger.info(
+                        'Worker PID {} did not signal that it is ready within'
+                        ' {} seconds, stopping PID {}.'.format(
+                            worker.pid, self.ready_timeout, previous.pid
+                        )
+                    )
+                    _stop_workers([previous], logger, shutdown_interval)
+                    previous = None
+
             elif signal == ControlSignal.SIGCHLD:
+                if previous is not None and not previous.is_alive:
+                    logger.info(
+                        'Previous worker PID {} exited.'.format(previous.pid)
+                    )
+                    previous.join()
+                    previous = None
+
                 if not worker.is_alive:
-                    break
+                    if previous is None:
+                        break
+
+                    worker.join()
+                    logger.info(
+                        'Worker PID {} exited with code {} before it was'
+                        ' ready, keeping PID {}.'.format(
+                            worker.pid, worker.exitcode, previous.pid
+                        )
+                    )
+                    worker, previous = previous, None
+
+        if handoff:
+            if previous is not None:
+                # the new worker is not ready yet so it is not serving
+                # anything, keep the previous one instead
+                _stop_workers([worker], logger, shutdown_interval)
+                worker, previous = previous, None
+
+            if worker.is_alive:
+                logger.info(
+                    'Keeping PID {} running until the next worker is'
+                    ' ready.'.format(worker.pid)
+                )
+                self.handoff_worker = worker
+                return result, None
+
+        if self.tcp_proxy is not None:
+            # do not forward new connections to a worker that is exiting
+            self.tcp_proxy.hold()
 
         if worker.is_alive and shutdown_interval:
             if soft_kill:
@@ -372,18 +1390,329 @@ def _run_worker(self, worker, logger=None, shutdown_interval=None):
             worker.wait(shutdown_interval)
 
     finally:
-        if worker.is_alive:
-            logger.info('Server did not exit, forcefully killing.')
-            worker.kill()
-            worker.join()
+        if ready_timer is not None:
+            ready_timer.cancel()
 
-        else:
-            worker.join()
-        logger.debug('Server exited with code %d.' % worker.exitcode)
+        if previous is not None:
+            _stop_workers([previous], logger, shutdown_interval)
+
+        if worker is not self.handoff_worker:
+            if worker.is_alive:
+                logger.info('Server did not exit, forcefully killing.')
+                worker.kill()
+                worker.join()
+
+            else:
+                worker.join()
+            logger.debug('Server exited with code %d.' % worker.exitcode)
+
+        if self.tcp_proxy is not None:
+            self.tcp_proxy.release()
 
     return result, worker.exitcode
 
 
+class PoolSlot:
+    """The state of one of the workers in a pool."""
+
+    def __init__(self, service, index, count, spec, restart_policy):
+        self.service = service
+        self.index = index
+        self.count = count
+        self.spec = spec
+        self.restart_policy = restart_policy
+        self.worker = None
+        self.started = None
+
+        # the worker should be replaced by a rolling restart
+        self.stale = False
+
+        # the time until which a rolling restart waits for the new worker
+        # to be ready before moving on
+        self.ready_deadline = None
+
+        # the time at which a worker that exited is started again, if
+        # ``None`` it waits for a file to change
+        self.restart_at = None
+
+    @property
+    def label(self):
+        label = 'worker {} of {}'.format(self.index + 1, self.count)
+        if self.service is None:
+            return label
+        if self.count == 1:
+            return 'service {}'.format(self.service)
+        return 'service {} {}'.format(self.service, label)
+
+
+def _get_services(self):
+    if not self.services:
+        return [
+            (None, (self.worker_path, self.worker_args, self.worker_kwargs))
+        ]
+    services = []
+    for name, spec in self.services.items():
+        if isinstance(spec, str):
+            spec = (spec, None, None)
+        services.append((name, tuple(spec)))
+    return services
+
+
+def _run_pool(self):
+    logger = self.logger
+    packets = deque()
+    timers = []
+
+    def packet_handler(source):
+        def handle_packet(packet):
+            packets.append((source, packet))
+            os.write(self.control_w, ControlSignal.WORKER_COMMAND)
+
+        return handle_packet
+
+    def wake_up_at(when):
+        timer = threading.Timer(
+            max(0, when - time.monotonic()),
+            os.write,
+            (self.control_w, ControlSignal.WAKEUP),
+        )
+        timer.daemon = True
+        timer.start()
+        timers.append(timer)
+
+    def start(slot):
+        slot.worker = worker = self._make_worker(slot.spec)
+        worker.start(packet_handler(worker))
+        self.process_group.add_child(worker.pid)
+        slot.started = time.monotonic()
+        slot.restart_at = None
+        logger.info(
+            'Starting monitor for PID {} ({}).'.format(worker.pid, slot.label)
+        )
+
+    def find_slot(worker):
+        for slot in slots:
+            if slot.worker is worker:
+                return slot
+
+    def mark_stale(services=None):
+        for slot in slots:
+            if services is None or slot.service in services:
+                slot.stale = True
+                slot.restart_policy.reset()
+
+    def find_affected_services(paths):
+        services = set()
+        for path in paths:
+            owners = {
+                service
+                for service, watched in watched_paths.items()
+                if path in watched
+            }
+            if not owners:
+                # a path no worker asked for, such as a module preloaded
+                # into the fork server or one restored from the manifest
+                return None
+            services.update(owners)
+        return services
+
+    def reap(slot):
+        worker, slot.worker = slot.worker, None
+        worker.join()
+        slot.ready_deadline = None
+        logger.debug(
+            'PID {} ({}) exited with code {}.'.format(
+                worker.pid, slot.label, worker.exitcode
+            )
+        )
+        uptime = time.monotonic() - slot.started
+        result, delay = slot.restart_policy.decide(
+            WorkerResult.RELOAD, worker.exitcode, uptime, False
+        )
+        if slot.stale or result == WorkerResult.WAIT:
+            # a rolling restart or a file change will start it again
+            slot.restart_at = None
+        else:
+            slot.restart_at = time.monotonic() + delay
+            wake_up_at(slot.restart_at)
+
+    def roll():
+        now = time.monotonic()
+        for slot in slots:
+            if slot.worker is None and slot.restart_at is not None:
+                if slot.restart_at <= now:
+                    start(slot)
+
+        # replace one worker of each service at a time, waiting for the
+        # previous one to be ready such that no service runs out of capacity
+        busy = set()
+        for slot in slots:
+            if slot.ready_deadline is not None:
+                if slot.worker is not None and slot.ready_deadline > now:
+                    busy.add(slot.service)
+                    continue
+                slot.ready_deadline = None
+
+        for slot in slots:
+            # a worker that is not ready yet is not serving anything and
+            # may be replaced right away
+            if slot.stale and (
+                slot.service not in busy or slot.ready_deadline is not None
+            ):
+                slot.stale = False
+                if slot.worker is not None:
+                    worker, slot.worker = slot.worker, None
+                    logger.info('Restarting {}.'.format(slot.label))
+                    _stop_workers([worker], logger, self.shutdown_interval)
+                start(slot)
+                slot.ready_deadline = time.monotonic() + self.ready_timeout
+                wake_up_at(slot.ready_deadline)
+                busy.add(slot.service)
+
+    self.monitor.clear_changes()
+    slots = [
+        PoolSlot(
+            service,
+            index,
+            self.workers,
+            spec,
+            RestartPolicy(logger, self.reload_interval),
+        )
+        for service, spec in _get_services(self)
+        for index in range(self.workers)
+    ]
+
+    # the files each service asked to watch, used to only restart the
+    # services affected by a change
+    watched_paths = {slot.service: set() for slot in slots}
+    soft_kill = True
+    try:
+        for slot in slots:
+            start(slot)
+
+        while True:
+            roll()
+
+            # process all packets before moving on to signals to avoid
+            # missing any files that need to be watched
+            if packets:
+                source, cmd = packets.popleft()
+                slot = find_slot(source)
+                if slot is None:
+                    # a worker which has already been stopped
+                    continue
+
+                if cmd is None:
+                    if source.is_alive:
+                        # give the worker a moment to exit on its own
+                        source.wait(1)
+                    if source.is_alive:
+                        logger.info(
+                            'Pipe to PID {} ({}) died unexpectedly,'
+                            ' restarting it.'.format(source.pid, slot.label)
+                        )
+                        slot.stale = True
+                    else:
+                        os.write(self.control_w, ControlSignal.SIGCHLD)
+                    continue
+
+                logger.debug('Received worker command "{}".'.format(cmd[0]))
+                if cmd[0] == 'reload':
+                    mark_stale({slot.service})
+
+                elif cmd[0] == 'watch_files':
+                    for path in cmd[1]:
+                        watched_paths[slot.service].update(
+                            self.monitor.add_path(path)
+                        )
+
+                elif cmd[0] == 'graceful_shutdown':
+                    os.write(self.control_w, ControlSignal.SIGTERM)
+
+                elif cmd[0] == 'system_modules':
+                    self.system_modules.update(cmd[1])
+                    if self.zygote is not None:
+                        self.zygote.preload(cmd[1])
+                        for path in cmd[1].values():
+                            self.monitor.add_path(path)
+
+                elif cmd[0] == 'ready':
+                    slot.ready_deadline = None
+
+                else:  # pragma: no cover
+                    raise RuntimeError('received unknown control signal', cmd)
+
+                continue
+
+            signal = os.read(self.control_r, 1)
+
+            if not signal:
+                logger.error('Control pipe died unexpectedly.')
+                break
+
+            elif signal == ControlSignal.SIGINT:
+                logger.info('Received SIGINT, waiting for servers to exit ...')
+                soft_kill = False
+                break
+
+            elif signal == ControlSignal.SIGHUP:
+                logger.info('Received SIGHUP, triggering a rolling restart.')
+                mark_stale()
+
+            elif signal == ControlSignal.SIGTERM:
+                logger.info('Received SIGTERM, triggering a shutdown.')
+                break
+
+            elif signal == ControlSignal.FILE_CHANGED:
+                if self.monitor.is_changed:
+                    changed_paths = list(self.monitor.changed_paths)
+                    mark_stale(find_affected_services(changed_paths))
+                    if self.zygote is not None:
+                        # restart the zygote before forking new workers
+                        self._prepare_fork_server()
+                    self.monitor.clear_changes()
+
+            elif signal == ControlSignal.SIGCHLD:
+                for slot in slots:
+                    if slot.worker is not None and not slot.worker.is_alive:
+                        reap(slot)
+
+    finally:
+        for timer in timers:
+            timer.cancel()
+        workers = [slot.worker for slot in slots if slot.worker is not None]
+        _stop_workers(workers, logger, self.shutdown_interval, soft_kill)
+
+    exitcodes = [worker.exitcode for worker in workers]
+    return WorkerResult.EXIT, next(filter(None, exitcodes), 0)
+
+
+def _stop_workers(workers, logger, shutdown_interval, soft_kill=True):
+    if shutdown_interval:
+        if soft_kill:
+            for worker in workers:
+                if worker.is_alive:
+                    worker.kill(soft=True)
+        deadline = time.monotonic() + shutdown_interval
+        for worker in workers:
+            if worker.is_alive:
+                worker.wait(max(0, deadline - time.monotonic()))
+    for worker in workers:
+        if worker.is_alive:
+            logger.info(
+                'Worker PID {} did not exit, forcefully killing.'.format(
+                    worker.pid
+                )
+            )
+            worker.kill()
+        worker.join()
+        logger.debug(
+            'Worker PID {} exited with code {}.'.format(
+                worker.pid, worker.exitcode
+            )
+        )
+
+
 def wait_main():
     try:
         reloader = get_reloader()
@@ -416,6 +1745,11 @@ def find_default_monitor_factory(logger):
 
         logger.debug('File monitor backend: watchdog')
 
+    elif is_inotify_supported():
+        from .inotify import InotifyFileMonitor as monitor_factory
+
+        logger.debug('File monitor backend: inotify')
+
     else:
         from .polling import PollingFileMonitor as monitor_factory
 
@@ -434,6 +1768,19 @@ def start_reloader(
     worker_args=None,
     worker_kwargs=None,
     ignore_files=None,
+    verify_changes=False,
+    wait_for_vcs=False,
+    watch_manifest=None,
+    settle_interval=0,
+    max_settle_interval=None,
+    standby=False,
+    fork_server=False,
+    blue_green=False,
+    bind=None,
+    proxy=None,
+    workers=1,
+    services=None,
+    hot_reload=False,
 ):
     """
     Start a monitor and then fork a worker process which starts by executing
@@ -465,7 +1812,8 @@ def start_reloader(
     ``monitor_factory`` is an instance of
     :class:`hupper.interfaces.IFileMonitorFactory`. If left unspecified, this
     will try to create a :class:`hupper.watchdog.WatchdogFileMonitor` if
-    `watchdog <https://pypi.org/project/watchdog/>`_ is installed and will
+    `watchdog <https://pypi.org/project/watchdog/>`_ is installed, then a
+    :class:`hupper.inotify.InotifyFileMonitor` on Linux, and will
     fallback to the less efficient
     :class:`hupper.polling.PollingFileMonitor` otherwise.
 
@@ -476,6 +1824,82 @@ def start_reloader(
 
     ``ignore_files`` if provided must be an iterable of shell-style patterns
     to ignore.
+
+    ``verify_changes`` enables checking the size, mtime, inode and finally
+    a hash of the contents of a changed file before reloading, to ignore
+    events for files which were touched but not actually modified. Default
+    is ``False``.
+
+    ``wait_for_vcs`` enables holding file changes while a ``git`` or ``hg``
+    operation, such as a checkout or rebase, is rewriting a repository
+    containing a watched file, and reloading once after it finishes instead
+    of restarting on a half-updated tree. Default is ``False``.
+
+    ``watch_manifest`` is an optional path to a cache file used to remember
+    the watched files between runs. The files are monitored as soon as the
+    reloader starts, before the worker has finished importing the app, such
+    that edits made while the app is starting are not missed.
+
+    ``settle_interval`` is a value in seconds to wait for more files to
+    change before reloading, such that saving many files at once, or a
+    formatter rewriting them, results in a single reload. The reload happens
+    once no file changed for ``settle_interval`` seconds, but at most
+    ``max_settle_interval`` seconds after the first change. The maximum
+    defaults to five times the ``settle_interval``. Default is ``0`` which
+    reloads immediately.
+
+    ``standby`` enables keeping a worker process spawned ahead of time, with
+    the third-party modules used by the previous worker already imported,
+    to cut the time it takes to reload. Default is ``False``.
+
+    ``fork_server`` enables forking each worker from a long-lived process
+    which has imported the third-party modules used by the previous worker,
+    instead of starting a new interpreter. It is only supported on Linux,
+    see :func:`hupper.is_forkserver_supported`. Default is ``False``.
+
+    ``blue_green`` enables starting the next worker while the current one
+    keeps running. The current worker is stopped once the next one invokes
+    :meth:`hupper.interfaces.IReloaderProxy.ready`, or after 10 seconds if
+    it never does, and kept running if the next one exits before that. The
+    app should invoke ``ready`` and must be able to run twice at the same
+    time, for example by binding its sockets with ``SO_REUSEPORT``. Default
+    is ``False``.
+
+    ``bind`` is a list of addresses, such as ``127.0.0.1:8000`` or
+    ``unix:/path/to/socket``, on which the monitor listens once. The sockets
+    are passed to each worker, available from
+    :meth:`hupper.interfaces.IReloaderProxy.sockets`, such that connections
+    made while the worker is restarting wait in the backlog instead of being
+    refused. Default is ``None``.
+
+    ``proxy`` is a tuple of ``(listen, target)`` addresses for apps that
+    cannot use sockets from ``bind``. The monitor listens on ``listen`` and
+    forwards each connection to ``target``, on which the worker listens.
+    Connections made while the worker is restarting are held until the new
+    worker accepts connections. Default is ``None``.
+
+    ``workers`` is the number of copies of the worker to run, usually
+    sharing sockets from ``bind``. On a change they are restarted one at a
+    time so the pool never runs out of capacity, moving on once each new
+    worker invokes :meth:`hupper.interfaces.IReloaderProxy.ready` or after
+    10 seconds. A worker that exits is restarted without cycling the
+    others. Default is ``1``.
+
+    ``services`` runs several workers side by side under one monitor. It is
+    a dict mapping a name to either a dotted path like ``worker_path`` or a
+    tuple of ``(worker_path, worker_args, worker_kwargs)``, in which case
+    ``worker_path`` is ignored. Each service watches its own files, usually
+    the modules it imported, and a change only restarts the services
+    watching the changed file. A change to a file shared by all of them is
+    noticed once and restarts them all. Default is ``None``.
+
+    ``hot_reload`` enables reloading changed modules inside the running
+    worker instead of restarting it. Only modules which set
+    ``__hupper_reload_safe__ = True`` are reloaded, along with the modules
+    that imported functions, classes or other objects from them, in
+    dependency order. If any of those modules is not reload-safe, or a
+    changed file is not a module, the worker is restarted as usual. It is
+    not supported with ``workers`` or ``services``. Default is ``False``.
     """
     if is_active():
         return get_reloader()
@@ -503,5 +1927,18 @@ def start_reloader(
         monitor_factory=monitor_factory,
         logger=logger,
         ignore_files=ignore_files,
+        verify_changes=verify_changes,
+        wait_for_vcs=wait_for_vcs,
+        watch_manifest=watch_manifest,
+        settle_interval=settle_interval,
+        max_settle_interval=max_settle_interval,
+        standby=standby,
+        fork_server=fork_server,
+        blue_green=blue_green,
+        bind=bind,
+        proxy=proxy,
+        workers=workers,
+        services=services,
+        hot_reload=hot_reload,
     )
     return reloader.run()
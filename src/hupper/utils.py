@@ -1,6 +1,8 @@
 import importlib
 import json
 import os
+import socket
+import stat
 import subprocess
 import sys
 
@@ -34,6 +36,26 @@ def is_watchdog_supported():
     return True
 
 
+def is_inotify_supported():
+    """Return ``True`` if the Linux inotify API is available."""
+    if not sys.platform.startswith('linux'):
+        return False
+
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        return hasattr(libc, 'inotify_init1')
+    except Exception:
+        return False
+
+
+def is_forkserver_supported():
+    """Return ``True`` if workers can be forked from a fork server."""
+    return sys.platform.startswith('linux') and hasattr(os, 'fork')
+
+
 def is_watchman_supported():
     """Return ``True`` if watchman is available."""
     if WIN:
@@ -59,5 +81,60 @@ def get_watchman_sockpath(binpath='watchman'):
     return result['sockname']
 
 
+def parse_address(value):
+    """
+    Parse a listen address into a tuple of ``(family, address)``.
+
+    Supported formats are ``host:port``, ``[host]:port`` for IPv6,
+    ``:port`` for all interfaces, ``port`` for localhost and
+    ``unix:/path/to/socket``.
+
+    Raises a ``ValueError`` if the address is invalid.
+
+    """
+    if value.startswith('unix:'):
+        path = value[len('unix:') :]
+        if not path or not hasattr(socket, 'AF_UNIX'):
+            raise ValueError('invalid address: {}'.format(value))
+        return socket.AF_UNIX, path
+
+    host, _, port = value.rpartition(':')
+    family = socket.AF_INET
+    if host.startswith('[') and host.endswith(']'):
+        host = host[1:-1]
+        family = socket.AF_INET6
+    elif not _:
+        host = '127.0.0.1'
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError('invalid address: {}'.format(value))
+    if not 0 <= port <= 65535:
+        raise ValueError('invalid address: {}'.format(value))
+    return family, (host, port)
+
+
+def bind_socket(value, backlog=socket.SOMAXCONN):
+    """Return a socket listening on the address ``value``."""
+    family, address = parse_address(value)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        if family == getattr(socket, 'AF_UNIX', None):
+            # remove a socket left behind by a previous run
+            try:
+                if stat.S_ISSOCK(os.stat(address).st_mode):
+                    os.unlink(address)
+            except OSError:
+                pass
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(address)
+        sock.listen(backlog)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
 def is_stream_interactive(stream):
     return stream is not None and stream.isatty()
@@ -1,10 +1,14 @@
 # check ``hupper.utils.is_watchdog_supported`` before using this module
+import fnmatch
 import os.path
+import queue
+import re
 import threading
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 
 from .interfaces import IFileMonitor
+from .worker import get_system_paths
 
 
 class WatchdogFileMonitor(FileSystemEventHandler, Observer, IFileMonitor):
@@ -16,36 +20,246 @@ class WatchdogFileMonitor(FileSystemEventHandler, Observer, IFileMonitor):
 
     ``logger`` is an :class:`hupper.interfaces.ILogger` instance.
 
+    ``roots`` is a list of project folders. Sibling folders within a root
+    are coalesced into a single recursive watch on a common ancestor if
+    enough of the files below it are being tracked, see
+    :class:`.WatchPlanner`. Default is the current working directory.
+
+    The folders of new paths are watched right away from a background
+    thread, which coalesces them into recursive watches once no more paths
+    were added for :attr:`plan_delay` seconds.
+
+    Events are matched against an immutable snapshot of the tracked paths
+    without taking any locks. Matching paths are handed to a separate thread
+    which invokes ``callback`` in batches, outside of any lock.
+
+    ``ignore_patterns`` is a list of shell-style patterns matched against the
+    basename of a path. Events for matching files, such as compiled python
+    files and editor swap files, are discarded before being dispatched
+    unless the file is tracked. Default is :attr:`default_ignore_patterns`.
+
     """
 
-    def __init__(self, callback, logger, **kw):
+    default_ignore_patterns = (
+        '*.py[cod]',
+        '*.sw[a-p]',
+        '*.swx',
+        '*~',
+        '*.tmp',
+        '.#*',
+        '#*#',
+        '.*.kate-swp',
+        '.goutputstream-*',
+        '4913',
+    )
+
+    # collect paths for this long before planning the watches again
+    plan_delay = 0.1
+
+    def __init__(
+        self, callback, logger, roots=None, ignore_patterns=None, **kw
+    ):
         super(WatchdogFileMonitor, self).__init__()
         self.callback = callback
         self.logger = logger
         self.paths = set()
         self.dirpaths = set()
+        self.watches = {}
+        self.planner = WatchPlanner(roots)
         self.lock = threading.Lock()
+        self.schedule_lock = threading.Lock()
+        if ignore_patterns is None:
+            ignore_patterns = self.default_ignore_patterns
+        self.ignore_re = re.compile(
+            '|'.join(fnmatch.translate(p) for p in ignore_patterns) or '$^'
+        )
+        self.snapshot = {}
+        self.changes = queue.Queue()
+        self.dispatcher = threading.Thread(target=self._dispatch_changes)
+        self.dispatcher.daemon = True
+        self.pending_dirpaths = []
+        self.plan_requested = threading.Event()
+        self.stopping = threading.Event()
+        self.plan_thread = threading.Thread(target=self._plan_watches)
+        self.plan_thread.daemon = True
+
+    def start(self):
+        # watch the paths added so far before the first event is reported
+        with self.lock:
+            self.pending_dirpaths = []
+        self._replan()
+        super(WatchdogFileMonitor, self).start()
+        self.dispatcher.start()
+        self.plan_thread.start()
+
+    def stop(self):
+        super(WatchdogFileMonitor, self).stop()
+        self.changes.put(None)
+        self.stopping.set()
+        self.plan_requested.set()
+
+    def join(self):
+        super(WatchdogFileMonitor, self).join()
+        if self.dispatcher.is_alive():
+            self.dispatcher.join()
+        if self.plan_thread.is_alive():
+            self.plan_thread.join()
 
     def add_path(self, path):
         with self.lock:
+            if path in self.paths:
+                return
+            self.paths.add(path)
+            # invalidate the snapshot, it is rebuilt on the next event which
+            # avoids copying the set for every path in a large batch
+            self.snapshot = None
+
             dirpath = os.path.dirname(path)
-            if dirpath not in self.dirpaths:
-                try:
-                    self.schedule(self, dirpath)
-                except OSError as ex:  # pragma: no cover
-                    # watchdog raises exceptions if folders are missing
-                    # or if the ulimit is passed
-                    self.logger.error('watchdog error: ' + str(ex))
-                else:
-                    self.dirpaths.add(dirpath)
+            if dirpath in self.dirpaths:
+                return
+            self.dirpaths.add(dirpath)
+            if self._is_covered(dirpath):
+                return
+            self.pending_dirpaths.append(dirpath)
 
-            if path not in self.paths:
-                self.paths.add(path)
+        # planning walks every tracked path so it is done in batches from a
+        # background thread, which also avoids scheduling watches from the
+        # observer thread when a tracked file is renamed
+        self.plan_requested.set()
 
-    def _check(self, path):
+    def _plan_watches(self):
+        while True:
+            self.plan_requested.wait()
+            if self.stopping.is_set():
+                break
+            self.plan_requested.clear()
+
+            # watch the new folders right away such that no events are missed
+            # while waiting for more paths
+            self._schedule_pending()
+            if self.stopping.wait(self.plan_delay):
+                break
+            self._schedule_pending()
+            self._replan()
+
+    def _schedule_pending(self):
         with self.lock:
-            if path in self.paths:
-                self.callback(path)
+            dirpaths, self.pending_dirpaths = self.pending_dirpaths, []
+        # observer.schedule acquires the observer's lock which is also held
+        # while dispatching events to _check so it must be invoked without
+        # holding self.lock to avoid deadlocks
+        with self.schedule_lock:
+            for dirpath in dirpaths:
+                if not self._is_covered(dirpath):
+                    self._schedule((dirpath, False))
+
+    def _replan(self):
+        with self.lock:
+            paths = list(self.paths)
+        plan = self.planner.plan(paths)
+        with self.schedule_lock:
+            self._apply_plan(plan)
+
+    def _is_covered(self, dirpath):
+        for watchpath, recursive in list(self.watches):
+            if watchpath == dirpath:
+                return True
+            if recursive and dirpath.startswith(watchpath + os.sep):
+                return True
+        return False
+
+    def _apply_plan(self, plan):
+        wanted = set(plan)
+        with self.lock:
+            current = set(self.watches)
+        # schedule new watches before removing the old ones so that no
+        # events are missed in between
+        for key in sorted(wanted - current):
+            self._schedule(key)
+        for key in current - wanted:
+            with self.lock:
+                watch = self.watches.pop(key)
+            self.unschedule(watch)
+
+    def _schedule(self, key):
+        dirpath, recursive = key
+        try:
+            watch = self.schedule(self, dirpath, recursive=recursive)
+        except OSError as ex:  # pragma: no cover
+            # watchdog raises exceptions if folders are missing
+            # or if the ulimit is passed
+            self.logger.error('watchdog error: ' + str(ex))
+        else:
+            with self.lock:
+                self.watches[key] = watch
+            if recursive:
+                self.logger.debug(
+                    'watchdog is recursively watching ' + dirpath
+                )
+
+    def _get_snapshot(self):
+        """Return an index of the tracked basenames in each folder."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None:
+                    index = {}
+                    for path in self.paths:
+                        dirpath, name = os.path.split(path)
+                        index.setdefault(dirpath, set()).add(name)
+                    snapshot = self.snapshot = {
+                        k: frozenset(v) for k, v in index.items()
+                    }
+        return snapshot
+
+    def _is_tracked(self, path):
+        dirpath, name = os.path.split(path)
+        names = self._get_snapshot().get(dirpath)
+        return names is not None and name in names
+
+    def _is_ignored(self, path):
+        return self.ignore_re.match(os.path.basename(path)) is not None
+
+    def _is_irrelevant(self, path):
+        # the patterns only apply to untracked files, such that a file the
+        # app asked to watch is never dropped
+        return self._is_ignored(path) and not self._is_tracked(path)
+
+    def _check(self, path):
+        if self._is_tracked(path):
+            self.changes.put(path)
+
+    def _dispatch_changes(self):
+        while True:
+            path = self.changes.get()
+            if path is None:
+                break
+            batch = [path]
+            try:
+                while True:
+                    batch.append(self.changes.get_nowait())
+            except queue.Empty:
+                pass
+
+            seen = set()
+            for path in batch:
+                if path is None:
+                    return
+                if path not in seen:
+                    seen.add(path)
+                    self.callback(path)
+
+    def dispatch(self, event):
+        # discard irrelevant events before they reach the handlers
+        if event.is_directory:
+            return
+        dest_path = getattr(event, 'dest_path', None)
+        if self._is_irrelevant(event.src_path) and (
+            not dest_path or self._is_irrelevant(dest_path)
+        ):
+            return
+        super(WatchdogFileMonitor, self).dispatch(event)
 
     def on_created(self, event):
         self._check(event.src_path)
@@ -56,7 +270,134 @@ class WatchdogFileMonitor(FileSystemEventHandler, Observer, IFileMonitor):
     def on_moved(self, event):
         self._check(event.src_path)
         self._check(event.dest_path)
-        self.add_path(event.dest_path)
+        # keep following a tracked file that was renamed, but not into a
+        # temporary file such as a backup created by an editor
+        if self._is_tracked(event.src_path) and not self._is_ignored(
+            event.dest_path
+        ):
+            self.add_path(event.dest_path)
 
     def on_deleted(self, event):
         self._check(event.src_path)
+
+
+class WatchPlanner:
+    """
+    Decide which folders to schedule with the observer.
+
+    Every folder containing a tracked file needs to be watched. A common
+    ancestor of several of those folders is watched recursively instead if
+    the ratio of tracked files to untracked files below it is at least
+    ``ratio``. Recursive watches never extend above one of the ``roots``
+    and never contain one of the ``excluded`` paths, which defaults to
+    :func:`hupper.worker.get_system_paths`.
+
+    """
+
+    # the minimum number of folders a recursive watch must replace
+    min_folders = 2
+
+    def __init__(self, roots=None, excluded=None, ratio=1.0):
+        if roots is None:
+            roots = [os.getcwd()]
+        if excluded is None:
+            excluded = get_system_paths()
+        self.roots = [os.path.abspath(p) for p in roots]
+        self.excluded = [os.path.abspath(p) for p in excluded]
+        self.ratio = ratio
+        self.folder_sizes = {}
+
+    def plan(self, paths):
+        """
+        Return a list of ``(dirpath, recursive)`` tuples which cover the
+        parent folders of ``paths``.
+
+        """
+        counts = {}
+        for path in paths:
+            dirpath = os.path.dirname(path)
+            counts[dirpath] = counts.get(dirpath, 0) + 1
+
+        candidates = {}
+        for dirpath in counts:
+            for ancestor in self._ancestors(dirpath):
+                candidates.setdefault(ancestor, []).append(dirpath)
+
+        recursive = []
+        for ancestor in sorted(candidates, key=len):
+            dirpaths = candidates[ancestor]
+            if len(dirpaths) < self.min_folders:
+                continue
+            if any(is_within(ancestor, r) for r in recursive):
+                continue
+            if any(overlaps(ancestor, e) for e in self.excluded):
+                continue
+            tracked = sum(counts[d] for d in dirpaths)
+            limit = tracked + int(tracked / self.ratio)
+            untracked = self._count_files(ancestor, limit) - tracked
+            if untracked <= 0 or tracked / untracked >= self.ratio:
+                recursive.append(ancestor)
+
+        plan = [(r, True) for r in recursive]
+        for dirpath in counts:
+            if not any(is_within(dirpath, r) for r in recursive):
+                plan.append((dirpath, False))
+        return plan
+
+    def _ancestors(self, dirpath):
+        """Yield ``dirpath`` and its parents up to the containing root."""
+        for root in self.roots:
+            if is_within(dirpath, root):
+                break
+        else:
+            return
+        while True:
+            yield dirpath
+            if dirpath == root:
+                break
+            dirpath = os.path.dirname(dirpath)
+
+    def _count_files(self, dirpath, limit):
+        """
+        Count the files below ``dirpath``, giving up once ``limit`` is
+        exceeded to avoid walking huge trees.
+
+        """
+        total = 0
+        stack = [dirpath]
+        while stack and total <= limit:
+            folder = stack.pop()
+            size = self.folder_sizes.get(folder)
+            if size is None:
+                size = self.folder_sizes[folder] = scan_folder(folder)
+            total += size[0]
+            stack.extend(size[1])
+        return total
+
+
+def scan_folder(dirpath):
+    """Return the number of files and a list of subfolders in a folder."""
+    files = 0
+    folders = []
+    try:
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                    else:
+                        files += 1
+                except OSError:  # pragma: no cover
+                    pass
+    except OSError:
+        pass
+    return files, folders
+
+
+def is_within(path, root):
+    return path == root or path.startswith(root + os.sep)
+
+
+def overlaps(path, other):
+    """Return ``True`` if either path is within the other."""
+    return is_within(other, path) or is_within(path, other)
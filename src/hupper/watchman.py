@@ -8,6 +8,7 @@ import socket
 import threading
 import time
 
+from . import bser
 from .interfaces import IFileMonitor
 from .utils import get_watchman_sockpath
 
@@ -19,8 +20,60 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
 
     ``callback`` is a callable that accepts a path to a changed file.
 
+    ``use_bser`` controls whether to talk to the daemon using watchman's
+    binary BSER protocol which is much cheaper to decode than JSON when a
+    lot of files change at once. If the daemon does not accept BSER then
+    the monitor falls back to JSON. Default is ``True``.
+
+    Each root is subscribed with an expression listing the watched files
+    below it so the daemon only reports changes to those files. The
+    subscription is refreshed from the last clock as more files are added
+    and changes made to the new files before they were added are ignored.
+
+    New roots and subscription updates are registered from a background
+    thread such that :meth:`add_path` never blocks on the daemon. Requests
+    queued within :attr:`batch_delay` seconds are pipelined over the socket
+    and the monitor reconnects if a response does not arrive within
+    ``timeout`` seconds.
+
+    If the connection to the daemon is lost, for example because it was
+    restarted, the monitor reconnects with an exponential backoff between
+    :attr:`reconnect_delay` and :attr:`max_reconnect_delay` seconds and
+    resumes each subscription from the last clock reported for the root,
+    such that changes made in the meantime are reported in a single batch.
+
     """
 
+    # only these fields are decoded from BSER responses, the rest are skipped
+    response_keys = frozenset(
+        [
+            'version',
+            'error',
+            'warning',
+            'log',
+            'unilateral',
+            'subscription',
+            'root',
+            'files',
+            'canceled',
+            'watch',
+            'relative_path',
+            'clock',
+            'is_fresh_instance',
+            'state-enter',
+            'state-leave',
+        ]
+    )
+
+    recv_size = 64 * 1024
+
+    # collect registrations for this long such that a batch of paths
+    # results in a single pipelined round-trip
+    batch_delay = 0.05
+
+    reconnect_delay = 0.1
+    max_reconnect_delay = 10.0
+
     def __init__(
         self,
         callback,
@@ -28,6 +81,7 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
         sockpath=None,
         binpath='watchman',
         timeout=10.0,
+        use_bser=True,
         **kw,
     ):
         super(WatchmanFileMonitor, self).__init__()
@@ -35,52 +89,180 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
         self.logger = logger
         self.watches = set()
         self.paths = set()
+        self.names = {}
+        self.clocks = {}
+        self.added_names = {}
+        self.suppressed = set()
+        self.resumed_roots = set()
+        self.registrations = queue.Queue()
+        self.registrar = threading.Thread(target=self._process_registrations)
+        self.registrar.daemon = True
         self.lock = threading.Lock()
+        self.query_lock = threading.Lock()
         self.enabled = True
+        self.connected = False
+        self.stopped = threading.Event()
         self.sockpath = sockpath
         self.binpath = binpath
         self.timeout = timeout
+        self.use_bser = use_bser
+        self.encoding = None
         self.responses = queue.Queue()
+        self._sock = None
 
     def add_path(self, path):
-        is_new_root = False
         with self.lock:
-            root = os.path.dirname(path)
+            if path in self.paths:
+                return
+            self.paths.add(path)
+            if not self.connected:
+                # the path is watched once the connection is restored
+                return
+
+            dirpath = os.path.dirname(path)
             for watch in self.watches:
-                if watch == root or root.startswith(watch + os.sep):
+                if is_within(dirpath, watch):
+                    name = os.path.relpath(path, watch)
+                    self.names[watch].add(name)
+                    self.added_names.setdefault(watch, set()).add(name)
+                    self.registrations.put(('subscribe', watch))
                     break
             else:
-                is_new_root = True
+                self.registrations.put(('watch', dirpath))
+
+    def start(self):
+        self._connect()
+        self._restore_watches()
+        super(WatchmanFileMonitor, self).start()
+        self.registrar.start()
+
+    def _process_registrations(self):
+        while True:
+            item = self.registrations.get()
+            if item is None:
+                break
+            self.stopped.wait(self.batch_delay)
+            batch = [item]
+            try:
+                while True:
+                    batch.append(self.registrations.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                break
 
-            if path not in self.paths:
-                self.paths.add(path)
+            dirpaths = {v for k, v in batch if k == 'watch'}
+            roots = {v for k, v in batch if k == 'subscribe'}
+            try:
+                self._register(dirpaths, roots)
+            except queue.Empty:
+                self.logger.error(
+                    'Timed out waiting for a response from watchman,'
+                    ' reconnecting.'
+                )
+                # the reader thread restores every watch after reconnecting
+                self._close_sock()
+            except OSError:
+                # the connection was lost and the reader thread restores
+                # every watch after reconnecting
+                pass
 
-        # it's important to release the above lock before invoking _watch
-        # on a new root to prevent deadlocks
-        if is_new_root:
-            self._watch(root)
+    def _register(self, dirpaths, roots):
+        """
+        Watch the ``dirpaths`` and (re)subscribe to the ``roots`` using a
+        single round-trip for each step.
 
-    def start(self):
+        """
+        with self.query_lock:
+            with self.lock:
+                if not self.connected:
+                    return
+                dirpaths = [
+                    d
+                    for d in sorted(dirpaths)
+                    if not any(is_within(d, w) for w in self.watches)
+                ]
+
+            new_roots = []
+            results = self._query_many(
+                [['watch-project', dirpath] for dirpath in dirpaths]
+            )
+            for result in results:
+                # errors are logged by _handle_result
+                root = result.get('watch')
+                if root is not None and self._add_watch(root):
+                    new_roots.append(root)
+
+            # the subscriptions resume from the last clock such that no
+            # pending changes are lost, but the initial results would report
+            # the newly named files if they changed earlier, which the worker
+            # has already loaded, so those are looked up and ignored once
+            queries = []
+            with self.lock:
+                for root in sorted(roots):
+                    names = self.added_names.pop(root, None)
+                    since = self.clocks.get(root)
+                    if names and since is not None:
+                        query = self._query_command(root, since, names)
+                        queries.append((root, query))
+            if queries:
+                results = self._query_many([query for _, query in queries])
+                for (root, _), result in zip(queries, results):
+                    paths = get_file_paths(root, result.get('files', ()))
+                    with self.lock:
+                        self.suppressed.update(paths)
+
+            roots = sorted(roots.union(new_roots))
+            results = self._query_many(
+                [self._subscribe_command(root) for root in roots]
+            )
+            for root, result in zip(roots, results):
+                self._update_clock(root, result)
+            for root in new_roots:
+                self.logger.debug('watchman is now tracking root: ' + root)
+
+    def _connect(self):
+        if self.use_bser:
+            try:
+                self._open('bser')
+                return
+            except (bser.BserError, EOFError, OSError, KeyError) as ex:
+                self._close_sock()
+                self.logger.debug(
+                    'watchman did not accept BSER ({}), falling back to'
+                    ' JSON.'.format(ex)
+                )
+        self._open('json')
+
+    def _open(self, encoding):
         sockpath = self._resolve_sockpath()
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         sock.connect(sockpath)
         self._sock = sock
+        self.encoding = encoding
         self._recvbufs = []
+        self._buf = bytearray(self.recv_size)
+        self._view = memoryview(self._buf)
+        self._buf_start = self._buf_end = 0
 
         self._send(['version'])
         result = self._recv()
-        self.logger.debug('watchman v' + result['version'] + '.')
-
-        super(WatchmanFileMonitor, self).start()
+        self.logger.debug(
+            'watchman v{} using {}.'.format(result['version'], encoding)
+        )
 
     def join(self):
         try:
-            return super(WatchmanFileMonitor, self).join()
+            super(WatchmanFileMonitor, self).join()
+            if self.registrar.is_alive():
+                self.registrar.join()
         finally:
             self._close_sock()
 
     def stop(self):
         self.enabled = False
+        self.stopped.set()
+        self.registrations.put(None)
         self._close_sock()
 
     def run(self):
@@ -89,20 +271,82 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
                 result = self._recv()
             except socket.timeout:
                 continue
-            except OSError as ex:
-                if ex.errno == errno.EBADF:
-                    # this means the socket is closed which should only happen
-                    # when stop is invoked, leaving enabled false
-                    if self.enabled:
-                        self.logger.error(
-                            'Lost connection to watchman. No longer watching'
-                            ' for changes.'
-                        )
-                    break
-                raise
+            except (EOFError, OSError):
+                # a closed socket is expected when stop is invoked, leaving
+                # enabled false
+                if self.enabled:
+                    self._reconnect()
+                continue
 
             self._handle_result(result)
 
+    def _reconnect(self):
+        self.logger.error('Lost connection to watchman, reconnecting.')
+        with self.lock:
+            self.connected = False
+        self._close_sock()
+        # wake up a thread waiting on a response which will never arrive
+        self.responses.put(DISCONNECTED)
+
+        # hold the query lock such that no other thread talks to the daemon
+        # until the subscriptions are restored
+        with self.query_lock:
+            while not self.responses.empty():
+                self.responses.get_nowait()
+
+            delay = self.reconnect_delay
+            while self.enabled:
+                try:
+                    self._connect()
+                    self._restore_watches()
+                except (bser.BserError, EOFError, OSError, KeyError) as ex:
+                    self._close_sock()
+                    self.logger.debug(
+                        'Failed to reconnect to watchman, retrying in {:.1f}'
+                        ' seconds: {}'.format(delay, ex)
+                    )
+                    self.stopped.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                else:
+                    self.logger.info('Reconnected to watchman.')
+                    break
+
+    def _restore_watches(self):
+        """
+        Watch and subscribe to every root on a fresh connection, resuming
+        from the last clock of each root. Must be invoked from the thread
+        reading responses.
+
+        """
+        with self.lock:
+            dirpaths = sorted(self.watches)
+            self.watches.clear()
+            self.resumed_roots.update(self.clocks)
+
+        while True:
+            for dirpath in dirpaths:
+                with self.lock:
+                    is_covered = any(
+                        is_within(dirpath, w) for w in self.watches
+                    )
+                if not is_covered:
+                    self._watch(dirpath, query=self._query_direct)
+
+            with self.lock:
+                # watch the folders of paths which were added while
+                # disconnected, then loop in case more were added meanwhile
+                dirpaths = sorted(
+                    {
+                        os.path.dirname(path)
+                        for path in self.paths
+                        if not any(is_within(path, w) for w in self.watches)
+                    }
+                )
+                if not dirpaths:
+                    # paths added from now on are watched by add_path
+                    self.connected = True
+                    break
+
     def _handle_result(self, result):
         if 'warning' in result:
             self.logger.error('watchman warning: ' + result['warning'])
@@ -118,17 +362,59 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
                     'watchman has stopped following root: ' + root
                 )
                 with self.lock:
-                    self.watches.remove(root)
+                    self.watches.discard(root)
+                    self.names.pop(root, None)
+                    self.added_names.pop(root, None)
+                    self.clocks.pop(root, None)
+
+            elif 'state-enter' in result:
+                self.logger.debug(
+                    'watchman is holding changes in {} during {}.'.format(
+                        root, result['state-enter']
+                    )
+                )
+
+            elif 'state-leave' in result:
+                self.logger.debug(
+                    'watchman finished {} in {}.'.format(
+                        result['state-leave'], root
+                    )
+                )
 
             else:
-                files = result['files']
+                files = result.get('files', ())
                 with self.lock:
-                    for f in files:
-                        if isinstance(f, dict):
-                            f = f['name']
-                        path = os.path.join(root, f)
-                        if path in self.paths:
-                            self.callback(path)
+                    if 'clock' in result:
+                        self.clocks[root] = result['clock']
+                    is_resumed = root in self.resumed_roots
+                    self.resumed_roots.discard(root)
+
+                if result.get('is_fresh_instance'):
+                    if not is_resumed:
+                        # the initial results of a new subscription
+                        files = ()
+                    elif files:
+                        # the daemon restarted and cannot tell what changed
+                        # while it was down so assume everything did
+                        self.logger.info(
+                            'watchman lost track of changes in {}, assuming'
+                            ' the watched files were modified.'.format(root)
+                        )
+
+                paths = get_file_paths(root, files)
+                if self.suppressed:
+                    with self.lock:
+                        suppressed = self.suppressed.intersection(paths)
+                        self.suppressed.difference_update(suppressed)
+                    paths = [p for p in paths if p not in suppressed]
+
+                # the daemon only reports the files named in the
+                # subscription but the set is checked in case a file was
+                # reported under another name, paths are never removed so
+                # this does not require the lock
+                for path in paths:
+                    if path in self.paths:
+                        self.callback(path)
 
         if not self._is_unilateral(result):
             self.responses.put(result)
@@ -144,6 +430,12 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
 
     def _close_sock(self):
         if self._sock:
+            try:
+                # shutdown wakes up a thread blocked in select on the socket
+                # which closing it from another thread does not
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             try:
                 self._sock.close()
             except Exception:
@@ -156,27 +448,79 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
             return self.sockpath
         return get_watchman_sockpath(self.binpath)
 
-    def _watch(self, root):
-        result = self._query(['watch-project', root])
-        if result['watch'] != root:
-            root = result['watch']
-        self._query(
-            [
-                'subscribe',
-                root,
-                '{}.{}.{}'.format(os.getpid(), id(self), root),
-                {
-                    # +1 second because we don't want any buffered changes
-                    # if the daemon is already watching the folder
-                    'since': int(time.time() + 1),
-                    'expression': ['type', 'f'],
-                    'fields': ['name'],
-                },
-            ]
-        )
+    def _watch(self, dirpath, query):
+        result = query(['watch-project', dirpath])
+        root = result['watch']
+        self._add_watch(root)
+        result = query(self._subscribe_command(root))
+        self._update_clock(root, result)
         self.logger.debug('watchman is now tracking root: ' + root)
+
+    def _add_watch(self, root):
+        """Track a new ``root``, returning ``False`` if it already was."""
         with self.lock:
+            if root in self.watches:
+                return False
             self.watches.add(root)
+            self.names[root] = {
+                os.path.relpath(path, root)
+                for path in self.paths
+                if is_within(path, root)
+            }
+            return True
+
+    def _subscribe_command(self, root):
+        with self.lock:
+            names = sorted(self.names.get(root, ()))
+            since = self.clocks.get(root)
+        if since is None:
+            # +1 second because we don't want any buffered changes
+            # if the daemon is already watching the folder
+            since = int(time.time() + 1)
+        # re-subscribing with the same name replaces the subscription and
+        # starting from a clock covers changes made in between
+        return [
+            'subscribe',
+            root,
+            '{}.{}.{}'.format(os.getpid(), id(self), root),
+            {
+                'since': since,
+                'expression': get_expression(names),
+                'fields': ['name'],
+                # hold notifications while mercurial updates the tree, other
+                # version control operations are deferred by default
+                'defer': ['hg.update'],
+                'defer_vcs': True,
+            },
+        ]
+
+    def _query_command(self, root, since, names):
+        return [
+            'query',
+            root,
+            {
+                'since': since,
+                'expression': get_expression(sorted(names)),
+                'fields': ['name'],
+            },
+        ]
+
+    def _update_clock(self, root, result):
+        if 'clock' in result:
+            with self.lock:
+                self.clocks.setdefault(root, result['clock'])
+
+    def _wait_readable(self):
+        while True:
+            sock = self._sock
+            if sock is None:
+                # the socket was closed by stop
+                raise OSError(errno.EBADF, 'watchman socket is closed')
+            # use select because it unblocks immediately when the socket is
+            # closed unlike sock.settimeout which does not
+            ready_r, _, _ = select.select([sock], [], [], self.timeout)
+            if sock in ready_r:
+                return sock
 
     def _readline(self):
         # buffer may already have a line
@@ -186,19 +530,10 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
             return line
 
         while True:
-            # use select because it unblocks immediately when the socket is
-            # closed unlike sock.settimeout which does not
-            ready_r, _, _ = select.select([self._sock], [], [], self.timeout)
-            if self._sock not in ready_r:
-                continue
-            b = self._sock.recv(4096)
+            sock = self._wait_readable()
+            b = sock.recv(4096)
             if not b:
-                self.logger.error(
-                    'Lost connection to watchman. No longer watching for'
-                    ' changes.'
-                )
-                self.stop()
-                raise socket.timeout
+                raise EOFError
             if b'\n' in b:
                 result = b''.join(self._recvbufs)
                 line, b = b.split(b'\n', 1)
@@ -206,7 +541,60 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
                 return result + line
             self._recvbufs.append(b)
 
+    def _read_pdu(self):
+        """Return a memoryview of the next BSER payload."""
+        while True:
+            header = bser.parse_header(
+                self._view, self._buf_start, self._buf_end
+            )
+            if header is not None:
+                header_size, payload_size = header
+                start = self._buf_start + header_size
+                end = start + payload_size
+                if end <= self._buf_end:
+                    self._buf_start = end
+                    return self._view[start:end]
+                self._reserve(header_size + payload_size)
+            else:
+                self._reserve(self.recv_size)
+
+            sock = self._wait_readable()
+            n = sock.recv_into(self._view[self._buf_end :])
+            if not n:
+                raise EOFError
+            self._buf_end += n
+
+    def _reserve(self, size):
+        """Ensure the buffer can hold ``size`` bytes of the current PDU."""
+        pending = self._buf_end - self._buf_start
+        if self._buf_start and (
+            self._buf_start == self._buf_end
+            or self._buf_start + size > len(self._buf)
+        ):
+            # move the partial PDU to the front of the buffer, the buffer
+            # cannot be resized while views of it exist
+            self._buf[:pending] = bytes(
+                self._view[self._buf_start : self._buf_end]
+            )
+            self._buf_start, self._buf_end = 0, pending
+        if size > len(self._buf) or self._buf_end == len(self._buf):
+            buf = bytearray(max(size, len(self._buf) * 2))
+            buf[:pending] = self._view[self._buf_start : self._buf_end]
+            self._buf = buf
+            self._view = memoryview(buf)
+            self._buf_start, self._buf_end = 0, pending
+
     def _recv(self):
+        if self.encoding == 'bser':
+            payload = self._read_pdu()
+            try:
+                return bser.loads(payload, self.response_keys)
+            except bser.BserError as ex:  # pragma: no cover
+                self.logger.info(
+                    'Ignoring corrupted payload from watchman: ' + str(ex)
+                )
+                return {}
+
         line = self._readline().decode('utf8')
         try:
             return json.loads(line)
@@ -217,9 +605,59 @@ class WatchmanFileMonitor(threading.Thread, IFileMonitor):
             return {}
 
     def _send(self, msg):
-        cmd = json.dumps(msg).encode('ascii')
-        self._sock.sendall(cmd + b'\n')
+        sock = self._sock
+        if sock is None:
+            raise OSError(errno.EBADF, 'watchman socket is closed')
+        if self.encoding == 'bser':
+            sock.sendall(bser.dumps(msg))
+        else:
+            cmd = json.dumps(msg).encode('ascii')
+            sock.sendall(cmd + b'\n')
+
+    def _query_many(self, msgs):
+        """
+        Send several queries at once and wait for the responses, which the
+        daemon sends in the same order. Must be invoked while holding the
+        query lock.
 
-    def _query(self, msg, timeout=None):
+        Raises :class:`queue.Empty` if a response does not arrive in time.
+
+        """
+        for msg in msgs:
+            self._send(msg)
+        results = []
+        for _ in msgs:
+            result = self.responses.get(timeout=self.timeout)
+            if result is DISCONNECTED:
+                raise ConnectionError('lost connection to watchman')
+            results.append(result)
+        return results
+
+    def _query_direct(self, msg):
+        """Send a query and read the response on the current thread."""
         self._send(msg)
-        return self.responses.get(timeout=timeout)
+        while True:
+            result = self._recv()
+            if self._is_unilateral(result):
+                self._handle_result(result)
+            else:
+                return result
+
+
+# sentinel put on the response queue when the connection is lost
+DISCONNECTED = object()
+
+
+def get_expression(names):
+    return ['allof', ['type', 'f'], ['name', names, 'wholename']]
+
+
+def get_file_paths(root, files):
+    return [
+        os.path.join(root, f['name'] if isinstance(f, dict) else f)
+        for f in files
+    ]
+
+
+def is_within(path, root):
+    return path == root or path.startswith(root + os.sep)
@@ -1,8 +1,10 @@
 from _thread import interrupt_main
+import importlib
 from importlib.util import source_from_cache
 import os
 import signal
 import site
+import socket
 import sys
 import sysconfig
 import threading
@@ -11,19 +13,31 @@ import traceback
 
 from . import ipc
 from .interfaces import IReloaderProxy
-from .utils import resolve_spec
+from .utils import WIN, resolve_spec
 
 
 class WatchSysModules(threading.Thread):
-    """Poll ``sys.modules`` for imported modules."""
+    """
+    Poll ``sys.modules`` for imported modules.
+
+    ``modules_callback`` is an optional callable which is invoked with a
+    dict mapping the names of imported modules living in a system path, such
+    as ``site-packages``, to their files.
+
+    Modules which set ``__hupper_reload_safe__ = True`` may be reloaded in
+    place by :meth:`hot_reload`.
+
+    """
 
     poll_interval = 1
     ignore_system_paths = True
 
-    def __init__(self, callback):
+    def __init__(self, callback, modules_callback=None):
         super(WatchSysModules, self).__init__()
         self.paths = set()
         self.callback = callback
+        self.modules_callback = modules_callback
+        self.module_names = set()
         self.lock = threading.Lock()
         self.stopped = False
         self.system_paths = get_system_paths()
@@ -46,6 +60,25 @@ class WatchSysModules(threading.Thread):
                     new_paths.append(path)
         if new_paths:
             self.watch_paths(new_paths)
+        if self.modules_callback is not None:
+            self.update_modules()
+
+    def update_modules(self):
+        """Report new modules imported from a system path."""
+        modules = {}
+        with self.lock:
+            for name, module in list(sys.modules.items()):
+                if name in self.module_names:
+                    continue
+                self.module_names.add(name)
+                try:
+                    filename = module.__file__
+                except (AttributeError, ImportError):  # pragma: no cover
+                    continue
+                if filename and self.in_system_paths(filename):
+                    modules[name] = filename
+        if modules:
+            self.modules_callback(modules)
 
     def search_traceback(self, tb):
         """Inspect a traceback for new paths to add to our path set."""
@@ -59,6 +92,57 @@ class WatchSysModules(threading.Thread):
         if new_paths:
             self.watch_paths(new_paths)
 
+    def get_project_modules(self):
+        """Return a dict mapping source files to the project modules."""
+        modules = {}
+        for name, module in list(sys.modules.items()):
+            try:
+                filename = module.__file__
+            except (AttributeError, ImportError):  # pragma: no cover
+                continue
+            if not filename or self.in_system_paths(filename):
+                continue
+            for path in expand_source_paths([os.path.abspath(filename)]):
+                modules[path] = name
+        return modules
+
+    def hot_reload(self, paths):
+        """
+        Reload the modules loaded from ``paths`` in place, followed by the
+        modules holding a reference to a function, class or other object
+        they define, which would otherwise keep using the old versions.
+
+        A ``RuntimeError`` is raised if a path is not a module or one of the
+        modules is not marked as reload-safe, in which case nothing is
+        reloaded. Returns the names of the reloaded modules in the order in
+        which they were reloaded.
+
+        """
+        project_modules = self.get_project_modules()
+        names = set()
+        for path in paths:
+            name = project_modules.get(path)
+            if name is None:
+                raise RuntimeError('{} is not an imported module'.format(path))
+            names.add(name)
+
+        dependents = get_module_dependents(
+            {name: sys.modules[name] for name in project_modules.values()}
+        )
+        order = get_reload_order(names, dependents)
+        for name in order:
+            if not getattr(sys.modules[name], '__hupper_reload_safe__', False):
+                raise RuntimeError('{} is not reload-safe'.format(name))
+
+        for name in order:
+            try:
+                importlib.reload(sys.modules[name])
+            except Exception as ex:
+                raise RuntimeError(
+                    'failed to reload {}: {!r}'.format(name, ex)
+                )
+        return order
+
     def watch_paths(self, paths):
         if self.ignore_system_paths:
             paths = [path for path in paths if not self.in_system_paths(path)]
@@ -75,6 +159,63 @@ class WatchSysModules(threading.Thread):
         return False
 
 
+def get_module_dependents(modules):
+    """
+    Return a dict mapping the name of each module in ``modules`` to the
+    names of the other modules holding a reference to an object defined by
+    it in their globals.
+
+    A reference to the module object itself is not a dependency because
+    the module is updated in place when it is reloaded.
+
+    """
+    dependents = {}
+    for name, module in modules.items():
+        for value in list(getattr(module, '__dict__', {}).values()):
+            try:
+                owner = value.__module__
+            except Exception:
+                continue
+            if isinstance(owner, str) and owner != name and owner in modules:
+                dependents.setdefault(owner, set()).add(name)
+    return dependents
+
+
+def get_reload_order(names, dependents):
+    """
+    Return the modules in ``names`` along with all of their dependents,
+    ordered such that each module comes after the modules it depends on.
+
+    """
+    closure = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in closure:
+            closure.add(name)
+            pending.extend(dependents.get(name, ()))
+
+    dependencies = {}
+    for name in closure:
+        for dependent in dependents.get(name, ()):
+            dependencies.setdefault(dependent, set()).add(name)
+
+    order = []
+    visited = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        visited.add(name)
+        for dependency in sorted(dependencies.get(name, ())):
+            visit(dependency)
+        order.append(name)
+
+    for name in sorted(closure):
+        visit(name)
+    return order
+
+
 def get_py_path(path):
     try:
         return source_from_cache(path)
@@ -141,18 +282,65 @@ def iter_module_paths(modules=None):
 
 
 class Worker:
-    """A helper object for managing a worker process lifecycle."""
+    """
+    A helper object for managing a worker process lifecycle.
+
+    ``forkserver`` is an optional :class:`hupper.forkserver.ForkServer` used
+    to fork the process instead of spawning a new interpreter.
 
-    def __init__(self, spec, args=None, kwargs=None):
+    ``sockets`` is an optional list of listening sockets shared with the
+    process, see :meth:`hupper.interfaces.IReloaderProxy.sockets`.
+
+    ``report_modules`` enables sending the modules imported from a system
+    path to the monitor, for preloading them in the next worker.
+
+    """
+
+    def __init__(
+        self,
+        spec,
+        args=None,
+        kwargs=None,
+        forkserver=None,
+        sockets=None,
+        report_modules=False,
+    ):
         super(Worker, self).__init__()
         self.worker_spec = spec
         self.worker_args = args
         self.worker_kwargs = kwargs
+        self.forkserver = forkserver
+        self.sockets = list(sockets or [])
+        self.report_modules = report_modules
         self.pipe, self._child_pipe = ipc.Pipe()
         self.pid = None
         self.process = None
         self.exitcode = None
         self.stdin_termios = None
+        self._to_child = None
+
+    def prespawn(self, preload=()):
+        """
+        Start the process ahead of time and import the ``preload`` modules,
+        leaving it parked until :meth:`start` is invoked.
+
+        """
+        self.process, self._to_child = ipc.prespawn(
+            pass_fds=self._get_pass_fds(), preload=preload
+        )
+        self.pid = self.process.pid
+
+    def _get_pass_fds(self):
+        fds = [self._child_pipe.r_fd, self._child_pipe.w_fd]
+        if not WIN:
+            fds.extend(sock.fileno() for sock in self.sockets)
+        return fds
+
+    def _get_socket_handles(self):
+        if WIN:  # pragma: no cover
+            # a socket is shared with a specific process on windows
+            return [sock.share(self.pid) for sock in self.sockets]
+        return [sock.fileno() for sock in self.sockets]
 
     def start(self, on_packet=None):
         self.stdin_termios = ipc.snapshot_termios(sys.stdin)
@@ -163,12 +351,24 @@ class Worker:
             spec_kwargs=self.worker_kwargs,
             pipe=self._child_pipe,
         )
-        self.process = ipc.spawn(
-            __name__ + '.worker_main',
-            kwargs=kw,
-            pass_fds=[self._child_pipe.r_fd, self._child_pipe.w_fd],
-        )
-        self.pid = self.process.pid
+        if self.report_modules:
+            kw['report_modules'] = True
+        if self.process is None and self.forkserver is not None:
+            if self.sockets:
+                kw['sockets'] = self._get_socket_handles()
+            self.process = self.forkserver.spawn(
+                __name__ + '.worker_main', kw, pass_fds=self._get_pass_fds()
+            )
+            self.pid = self.process.pid
+
+        else:
+            if self.process is None:
+                self.prespawn()
+
+            if self.sockets:
+                kw['sockets'] = self._get_socket_handles()
+            to_child, self._to_child = self._to_child, None
+            ipc.resume(to_child, __name__ + '.worker_main', kw)
 
         # activate the pipe after forking
         self.pipe.activate(on_packet)
@@ -191,6 +391,23 @@ class Worker:
     def wait(self, timeout=None):
         return ipc.wait(self.process, timeout=timeout)
 
+    def discard(self):
+        """Stop a prespawned process that was never started."""
+        if self._to_child is not None:
+            # the process exits when the pipe is closed
+            try:
+                self._to_child.close()
+            except OSError:  # pragma: no cover
+                pass
+            self._to_child = None
+        if self.process is not None:
+            if self.wait(timeout=1) is None:
+                self.kill()
+            self.exitcode = self.wait()
+        self._child_pipe.close()
+        self.pipe.close()
+        self.pipe = None
+
     def join(self):
         self.exitcode = self.wait()
 
@@ -232,8 +449,10 @@ def is_active():
 
 
 class ReloaderProxy(IReloaderProxy):
-    def __init__(self, pipe):
+    def __init__(self, pipe, socket_handles=None):
         self.pipe = pipe
+        self.socket_handles = socket_handles or []
+        self._sockets = None
 
     def watch_files(self, files):
         files = [os.path.abspath(f) for f in files]
@@ -245,24 +464,51 @@ class ReloaderProxy(IReloaderProxy):
     def graceful_shutdown(self):
         self.pipe.send(('graceful_shutdown',))
 
+    def ready(self):
+        self.pipe.send(('ready',))
 
-def watch_control_pipe(pipe):
+    def sockets(self):
+        if self._sockets is None:
+            self._sockets = [
+                (
+                    socket.fromshare(handle)
+                    if isinstance(handle, bytes)
+                    else socket.socket(fileno=handle)
+                )
+                for handle in self.socket_handles
+            ]
+        return list(self._sockets)
+
+
+def watch_control_pipe(pipe, poller=None):
     def handle_packet(packet):
         if packet is None:
             interrupt_main()
 
+        elif packet[0] == 'hot_reload' and poller is not None:
+            try:
+                names = poller.hot_reload(packet[1])
+            except Exception as ex:
+                pipe.send(('hot_reload_failed', str(ex)))
+            else:
+                pipe.send(('hot_reloaded', names))
+
     pipe.activate(handle_packet)
 
 
-def worker_main(spec, pipe, spec_args=None, spec_kwargs=None):
+def worker_main(
+    spec,
+    pipe,
+    spec_args=None,
+    spec_kwargs=None,
+    sockets=None,
+    report_modules=False,
+):
     if spec_args is None:
         spec_args = []
     if spec_kwargs is None:
         spec_kwargs = {}
 
-    # activate the pipe after forking
-    watch_control_pipe(pipe)
-
     # SIGHUP is not supported on windows
     if hasattr(signal, 'SIGHUP'):
         signal.signal(signal.SIGHUP, signal.SIG_IGN)
@@ -272,12 +518,22 @@ def worker_main(spec, pipe, spec_args=None, spec_kwargs=None):
     sys.dont_write_bytecode = True
 
     global _reloader_proxy
-    _reloader_proxy = ReloaderProxy(pipe)
+    _reloader_proxy = ReloaderProxy(pipe, sockets)
 
-    poller = WatchSysModules(_reloader_proxy.watch_files)
+    def send_modules(names):
+        pipe.send(('system_modules', names))
+
+    # only the standby worker and the fork server preload the modules
+    poller = WatchSysModules(
+        _reloader_proxy.watch_files,
+        send_modules if report_modules else None,
+    )
     poller.daemon = True
     poller.start()
 
+    # activate the pipe after forking
+    watch_control_pipe(pipe, poller)
+
     # import the worker path before polling sys.modules
     func = resolve_spec(spec)
 
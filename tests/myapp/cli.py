@@ -17,10 +17,16 @@ def parse_options(args):
     )
     parser.add_argument('--watchman', action='store_true')
     parser.add_argument('--watchdog', action='store_true')
+    parser.add_argument('--inotify', action='store_true')
     parser.add_argument('--poll', action='store_true')
     parser.add_argument('--poll-interval', type=int)
     parser.add_argument('--reload-interval', type=int)
     parser.add_argument('--shutdown-interval', type=int)
+    parser.add_argument('--blue-green', action='store_true')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument(
+        '--service', action='append', dest='services', default=[]
+    )
     return parser.parse_args(args)
 
 
@@ -43,6 +49,11 @@ def main(args=None):
 
             kw['monitor_factory'] = WatchdogFileMonitor
 
+        if opts.inotify:
+            from hupper.inotify import InotifyFileMonitor
+
+            kw['monitor_factory'] = InotifyFileMonitor
+
         if opts.watchman:
             from hupper.watchman import WatchmanFileMonitor
 
@@ -54,11 +65,32 @@ def main(args=None):
         if opts.shutdown_interval is not None:
             kw['shutdown_interval'] = opts.shutdown_interval
 
+        if opts.blue_green:
+            kw['blue_green'] = True
+
+        if opts.workers is not None:
+            kw['workers'] = opts.workers
+
+        if opts.services:
+            # each service is a NAME=PATH pair watching its own file
+            base_args = []
+            if opts.callback_file:
+                base_args += ['--callback-file', opts.callback_file]
+            kw['services'] = {}
+            for service in opts.services:
+                name, path = service.split('=', 1)
+                kw['services'][name] = (
+                    __name__ + '.main',
+                    [base_args + ['--watch-file', path]],
+                    None,
+                )
+
         hupper.start_reloader(__name__ + '.main', **kw)
 
     if hupper.is_active():
         hupper.get_reloader().watch_files([os.path.join(here, 'foo.ini')])
         hupper.get_reloader().watch_files(opts.watch_files)
+        hupper.get_reloader().ready()
 
     if opts.callback_file:
         with open(opts.callback_file, 'ab') as fp:
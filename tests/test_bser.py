@@ -0,0 +1,102 @@
+import pytest
+import socket
+import struct
+
+from hupper import bser
+
+
+def encode_payload(value):
+    pdu = bser.dumps(value)
+    header_size, _ = bser.parse_header(pdu, 0, len(pdu))
+    return pdu[header_size:]
+
+
+def test_roundtrip():
+    value = {
+        'version': '4.9.0',
+        'files': ['a.py', 'b/c.py'],
+        'clock': 'c:123:45',
+        'is_fresh_instance': False,
+        'count': 1 << 40,
+        'neg': -200,
+        'ratio': 0.5,
+        'nothing': None,
+    }
+    pdu = bser.dumps(value)
+    header_size, payload_size = bser.parse_header(pdu, 0, len(pdu))
+    assert header_size + payload_size == len(pdu)
+    assert bser.loads(pdu[header_size:]) == value
+
+
+def test_parse_header_needs_more_data():
+    pdu = bser.dumps(list(range(1000)))
+    assert bser.parse_header(pdu, 0, 2) is None
+    assert bser.parse_header(pdu, 0, 3) is None
+    assert bser.parse_header(pdu, 0, 5) == (5, len(pdu) - 5)
+
+
+def test_parse_header_v2():
+    payload = encode_payload('foo')
+    pdu = (
+        bser.MAGIC_V2 + struct.pack('=I', 0) + b'\x03' + bytes([len(payload)])
+    )
+    assert bser.parse_header(pdu, 0, len(pdu)) == (8, len(payload))
+    assert bser.loads(payload) == 'foo'
+
+
+def test_parse_header_rejects_json():
+    with pytest.raises(bser.BserError):
+        bser.parse_header(b'{"version": "1"}\n', 0, 17)
+
+
+def test_loads_skips_unwanted_keys():
+    payload = encode_payload(
+        {
+            'root': '/foo',
+            'big': {'nested': [1, 2.0, None, True, 'x' * 100]},
+            'files': ['a.py'],
+        }
+    )
+    result = bser.loads(payload, keys={'root', 'files'})
+    assert result == {'root': '/foo', 'files': ['a.py']}
+
+
+def test_loads_template():
+    payload = bytearray([bser.BSER_TEMPLATE])
+    payload += encode_payload(['name', 'exists'])
+    payload += bytes([bser.BSER_INT8, 2])
+    payload += encode_payload('a.py') + bytes([bser.BSER_TRUE])
+    payload += encode_payload('b.py') + bytes([bser.BSER_SKIP])
+    assert bser.loads(bytes(payload)) == [
+        {'name': 'a.py', 'exists': True},
+        {'name': 'b.py'},
+    ]
+
+
+def test_loads_truncated():
+    payload = encode_payload({'files': ['a.py', 'b.py']})
+    with pytest.raises(bser.BserError):
+        bser.loads(payload[:-2])
+
+
+def test_watchman_reads_split_pdus(logger):
+    from hupper.watchman import WatchmanFileMonitor
+
+    monitor = WatchmanFileMonitor(lambda path: None, logger)
+    monitor.recv_size = 16
+    monitor.encoding = 'bser'
+    monitor._sock, peer = socket.socketpair()
+    monitor._buf = bytearray(monitor.recv_size)
+    monitor._view = memoryview(monitor._buf)
+    monitor._buf_start = monitor._buf_end = 0
+    try:
+        first = {'version': '1.0', 'unknown': 'x' * 50}
+        second = {'files': ['foo.py'], 'root': '/bar'}
+        data = bser.dumps(first) + bser.dumps(second)
+        peer.sendall(data[:10])
+        peer.sendall(data[10:])
+        assert monitor._recv() == {'version': '1.0'}
+        assert monitor._recv() == second
+    finally:
+        monitor._close_sock()
+        peer.close()
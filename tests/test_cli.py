@@ -1,7 +1,15 @@
 import argparse
 import pytest
+import socket
 
-from hupper.cli import interval_parser
+from hupper.cli import (
+    bind_parser,
+    interval_parser,
+    service_parser,
+    settle_interval_parser,
+    workers_parser,
+)
+from hupper.utils import bind_socket, parse_address
 
 
 @pytest.mark.parametrize('value', ['0', "-1"])
@@ -12,3 +20,62 @@ def test_interval_parser_errors(value):
 
 def test_interval_parser():
     assert interval_parser("5") == 5
+
+
+@pytest.mark.parametrize('value', ['-0.5', 'abc'])
+def test_settle_interval_parser_errors(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        settle_interval_parser(value)
+
+
+def test_settle_interval_parser():
+    assert settle_interval_parser("0.2") == 0.2
+    assert settle_interval_parser("0") == 0
+
+
+@pytest.mark.parametrize('value', ['localhost', 'foo:bar', ':70000', 'unix:'])
+def test_bind_parser_errors(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        bind_parser(value)
+
+
+def test_bind_parser():
+    assert bind_parser('127.0.0.1:8000') == '127.0.0.1:8000'
+    assert parse_address('8000') == (socket.AF_INET, ('127.0.0.1', 8000))
+    assert parse_address(':8000') == (socket.AF_INET, ('', 8000))
+    assert parse_address('[::1]:8000') == (socket.AF_INET6, ('::1', 8000))
+    if hasattr(socket, 'AF_UNIX'):
+        assert parse_address('unix:/tmp/app.sock') == (
+            socket.AF_UNIX,
+            '/tmp/app.sock',
+        )
+
+
+def test_bind_socket_without_unix_sockets(monkeypatch):
+    # windows builds of python do not define AF_UNIX
+    monkeypatch.delattr(socket, 'AF_UNIX', raising=False)
+    sock = bind_socket('127.0.0.1:0')
+    try:
+        assert sock.family == socket.AF_INET
+    finally:
+        sock.close()
+
+
+@pytest.mark.parametrize('value', ['web', '=myapp', 'web='])
+def test_service_parser_errors(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        service_parser(value)
+
+
+def test_service_parser():
+    assert service_parser('web=myapp.web') == ('web', 'myapp.web')
+
+
+@pytest.mark.parametrize('value', ['0', '-1', 'two'])
+def test_workers_parser_errors(value):
+    with pytest.raises(argparse.ArgumentTypeError, match='workers'):
+        workers_parser(value)
+
+
+def test_workers_parser():
+    assert workers_parser('4') == 4
@@ -0,0 +1,60 @@
+import os
+import pytest
+import queue
+import signal
+import sys
+import threading
+
+from hupper.ipc import Pipe
+from hupper.utils import is_forkserver_supported
+
+pytestmark = pytest.mark.skipif(
+    not is_forkserver_supported(), reason='fork server is not supported'
+)
+
+
+def report(pipe, exitcode=0):
+    pipe.send(('colorsys' in sys.modules, os.getppid()))
+    sys.exit(exitcode)
+
+
+def sleep_forever():
+    threading.Event().wait()
+
+
+@pytest.fixture
+def forkserver(logger):
+    from hupper.forkserver import ForkServer
+
+    exits = queue.Queue()
+    server = ForkServer(logger, on_exit=lambda: exits.put(True))
+    server.exits = exits
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_forks_from_preloaded_zygote(forkserver):
+    forkserver.preload({'colorsys': '/colorsys.py'})
+    c1, c2 = Pipe()
+    c1_q = queue.Queue()
+    c1.activate(c1_q.put)
+
+    process = forkserver.spawn(
+        __name__ + '.report',
+        {'pipe': c2, 'exitcode': 3},
+        pass_fds=[c2.r_fd, c2.w_fd],
+    )
+    c2.close()
+    assert c1_q.get(timeout=10) == (True, forkserver.process.pid)
+    assert process.wait(10) == 3
+    assert forkserver.exits.get(timeout=1)
+    assert forkserver.paths == {'/colorsys.py'}
+    c1.close()
+
+
+def test_kill_forked_process(forkserver):
+    process = forkserver.spawn(__name__ + '.sleep_forever', {})
+    assert process.poll() is None
+    process.kill()
+    assert process.wait(10) == -signal.SIGKILL
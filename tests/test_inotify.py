@@ -0,0 +1,55 @@
+import os
+import pytest
+import queue
+
+from hupper.utils import is_inotify_supported
+
+pytestmark = pytest.mark.skipif(
+    not is_inotify_supported(), reason='inotify is not supported'
+)
+
+
+@pytest.fixture
+def monitor(logger):
+    from hupper.inotify import InotifyFileMonitor
+
+    changes = queue.Queue()
+    monitor = InotifyFileMonitor(changes.put, logger, interval=0.1)
+    monitor.changes = changes
+    monitor.start()
+    try:
+        yield monitor
+    finally:
+        monitor.stop()
+        monitor.join()
+
+
+def test_detects_close_write(tmpdir, monitor):
+    path = tmpdir.join('foo.py').ensure().strpath
+    monitor.add_path(path)
+    with open(path, 'w') as fp:
+        fp.write('x = 1\n')
+    assert monitor.changes.get(timeout=5) == path
+
+
+def test_detects_atomic_rename(tmpdir, monitor):
+    path = tmpdir.join('foo.py').ensure().strpath
+    monitor.add_path(path)
+    tmp = tmpdir.join('.foo.py.swp').strpath
+    with open(tmp, 'w') as fp:
+        fp.write('x = 2\n')
+    os.rename(tmp, path)
+    assert monitor.changes.get(timeout=5) == path
+
+
+def test_ignores_unwatched_siblings(tmpdir, monitor):
+    path = tmpdir.join('foo.py').ensure().strpath
+    monitor.add_path(path)
+    tmpdir.join('bar.py').write('y = 1\n')
+    with pytest.raises(queue.Empty):
+        monitor.changes.get(timeout=0.5)
+
+
+def test_missing_folder_logs_error(tmpdir, monitor, logger):
+    monitor.add_path(tmpdir.join('missing', 'foo.py').strpath)
+    assert 'inotify error' in logger.get_output('error')
@@ -1,6 +1,7 @@
 import queue
+import sys
 
-from hupper.ipc import Pipe, spawn
+from hupper.ipc import Pipe, prespawn, resume, spawn
 
 
 def echo(pipe):
@@ -13,6 +14,12 @@ def echo(pipe):
     pipe.close()
 
 
+def report_modules(pipe, names):
+    pipe.activate(lambda _: None)
+    pipe.send([name for name in names if name in sys.modules])
+    pipe.close()
+
+
 def test_ipc_close():
     c1, c2 = Pipe()
     c1_q = queue.Queue()
@@ -32,3 +39,32 @@ def test_ipc_close():
             c1.close()
         finally:
             proc.terminate()
+
+
+def test_prespawn_preloads_modules():
+    c1, c2 = Pipe()
+    c1_q = queue.Queue()
+    c1.activate(c1_q.put)
+
+    proc, to_child = prespawn(
+        pass_fds=[c2.r_fd, c2.w_fd], preload=['colorsys', 'not_a_module']
+    )
+    with proc:
+        try:
+            resume(
+                to_child,
+                __name__ + '.report_modules',
+                {'pipe': c2, 'names': ['colorsys', 'wave']},
+            )
+            c2.close()
+            assert c1_q.get(timeout=10) == ['colorsys']
+            c1.close()
+        finally:
+            proc.terminate()
+
+
+def test_prespawn_discarded():
+    proc, to_child = prespawn()
+    with proc:
+        to_child.close()
+        assert proc.wait(timeout=10) == 0
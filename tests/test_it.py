@@ -28,3 +28,53 @@ def test_myapp_reloads_when_touching_pyfile(testapp):
 
     assert len(testapp.response) == 2
     assert testapp.stderr != ''
+
+
+def test_myapp_blue_green_reload(testapp):
+    testapp.start('myapp', ['--reload', '--blue-green'])
+    testapp.wait_for_response()
+    time.sleep(2)
+    util.touch(os.path.join(here, 'myapp/foo.ini'))
+    testapp.wait_for_response()
+    testapp.stop()
+
+    assert len(testapp.response) == 2
+    assert 'is ready, stopping PID' in testapp.stderr
+
+
+def test_myapp_pool_rolling_restart(testapp):
+    testapp.start('myapp', ['--reload', '--workers', '2'])
+    while len(testapp.response) < 2:
+        testapp.wait_for_response()
+    time.sleep(2)
+    util.touch(os.path.join(here, 'myapp/foo.ini'))
+    while len(testapp.response) < 4:
+        testapp.wait_for_response()
+    time.sleep(1)
+    testapp.stop()
+
+    assert len(testapp.response) == 4
+    assert 'worker 2 of 2' in testapp.stderr
+    assert 'Restarting worker 2 of 2' in testapp.stderr
+
+
+def test_myapp_services_only_restart_affected(testapp, tmp_path):
+    one = tmp_path / 'one.txt'
+    two = tmp_path / 'two.txt'
+    one.write_text('')
+    two.write_text('')
+    testapp.start(
+        'myapp',
+        ['--reload', '--service', 'one=%s' % one, '--service', 'two=%s' % two],
+    )
+    while len(testapp.response) < 2:
+        testapp.wait_for_response()
+    time.sleep(2)
+    util.touch(str(one), (time.time() + 5, time.time() + 5))
+    testapp.wait_for_response()
+    time.sleep(1)
+    testapp.stop()
+
+    assert len(testapp.response) == 3
+    assert 'Restarting service one.' in testapp.stderr
+    assert 'Restarting service two.' not in testapp.stderr
@@ -0,0 +1,178 @@
+import os
+import time
+
+from hupper.polling import PollingFileMonitor
+
+
+def make_file(tmpdir, name, age=0):
+    path = tmpdir.join(name).ensure().strpath
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def make_monitor(**kw):
+    changes = []
+    monitor = PollingFileMonitor(changes.append, **kw)
+    monitor.changes = changes
+    return monitor
+
+
+def tick(monitor):
+    paths = monitor.select_paths()
+    monitor.check_reload(paths)
+    monitor.update_tiers(paths)
+    return paths
+
+
+def test_detects_changes(tmpdir):
+    path = make_file(tmpdir, 'foo.py')
+    monitor = make_monitor()
+    monitor.add_path(path)
+    tick(monitor)
+    assert monitor.changes == []
+
+    mtime = time.time() + 10
+    os.utime(path, (mtime, mtime))
+    tick(monitor)
+    assert monitor.changes == [path]
+
+
+def test_splits_hot_and_cold_files(tmpdir):
+    hot = make_file(tmpdir, 'hot.py')
+    cold = [make_file(tmpdir, 'cold%d.py' % i, age=7200) for i in range(4)]
+    monitor = make_monitor(interval=1, cold_interval=4)
+    for path in [hot] + cold:
+        monitor.add_path(path)
+
+    # every path is scanned once when it is added
+    assert sorted(tick(monitor)) == sorted([hot] + cold)
+    assert monitor.hot_paths == {hot}
+
+    # afterward one cold file is visited each interval
+    seen = set()
+    for _ in range(4):
+        paths = tick(monitor)
+        assert hot in paths
+        assert len(paths) == 2
+        seen.update(paths)
+    assert seen == set([hot] + cold)
+
+
+def test_scans_cold_files_every_interval_by_default(tmpdir):
+    cold = [make_file(tmpdir, 'cold%d.py' % i, age=7200) for i in range(4)]
+    monitor = make_monitor(interval=1)
+    for path in cold:
+        monitor.add_path(path)
+    tick(monitor)
+    assert sorted(tick(monitor)) == sorted(cold)
+
+
+def test_cold_file_becomes_hot_after_change(tmpdir):
+    path = make_file(tmpdir, 'foo.py', age=7200)
+    monitor = make_monitor(interval=1, cold_interval=1)
+    monitor.add_path(path)
+    tick(monitor)
+    assert path not in monitor.hot_paths
+
+    os.utime(path, None)
+    tick(monitor)
+    assert monitor.changes == [path]
+    assert path in monitor.hot_paths
+
+
+def test_budget_limits_cold_scans(tmpdir):
+    hot = make_file(tmpdir, 'hot.py')
+    cold = [make_file(tmpdir, 'cold%d.py' % i, age=7200) for i in range(4)]
+    monitor = make_monitor(
+        interval=0.01, cold_interval=0.01, max_stats_per_second=300
+    )
+    for path in [hot] + cold:
+        monitor.add_path(path)
+    tick(monitor)
+
+    # a budget of 3 stats per interval leaves room for 2 cold files
+    paths = tick(monitor)
+    assert hot in paths
+    assert len(paths) == 3
+
+
+def test_detects_deleted_and_created_files(tmpdir):
+    foo = make_file(tmpdir, 'foo.py')
+    bar = make_file(tmpdir, 'bar.py')
+    missing = tmpdir.join('baz.py').strpath
+    monitor = make_monitor()
+    for path in (foo, bar, missing):
+        monitor.add_path(path)
+    tick(monitor)
+
+    os.unlink(foo)
+    tmpdir.join('baz.py').ensure()
+    tick(monitor)
+    assert monitor.changes == [missing, foo]
+
+
+def test_scans_each_folder_once(tmpdir, monkeypatch):
+    import hupper.polling
+
+    paths = [make_file(tmpdir, 'f%d.py' % i) for i in range(10)]
+    paths.append(make_file(tmpdir.mkdir('sub'), 'g.py'))
+    calls = []
+
+    def scan_folder(dirpath, names, throttle):
+        calls.append(dirpath)
+        return orig_scan_folder(dirpath, names, throttle)
+
+    orig_scan_folder = hupper.polling.scan_folder
+    monkeypatch.setattr(hupper.polling, 'scan_folder', scan_folder)
+    monitor = make_monitor()
+    for path in paths:
+        monitor.add_path(path)
+    tick(monitor)
+
+    # the lone file in sub/ is stat-ed directly
+    assert calls == [tmpdir.strpath]
+    assert sorted(monitor.mtimes) == sorted(paths)
+    assert all(monitor.mtimes.values())
+
+
+def test_parallel_scan(tmpdir):
+    paths = []
+    for i in range(6):
+        folder = tmpdir.mkdir('pkg%d' % i)
+        paths.extend(make_file(folder, 'f%d.py' % j) for j in range(i + 1))
+    monitor = make_monitor(max_workers=3)
+    for path in paths:
+        monitor.add_path(path)
+    tick(monitor)
+    assert sorted(monitor.mtimes) == sorted(paths)
+
+    os.unlink(paths[-1])
+    tick(monitor)
+    assert monitor.changes == [paths[-1]]
+    monitor.executor.shutdown()
+
+
+def test_shard_folders():
+    from hupper.polling import shard_folders
+
+    folders = {'a': {1, 2, 3, 4}, 'b': {1, 2}, 'c': {1, 2}, 'd': {1}}
+    shards = shard_folders(folders, 2)
+    assert shards == [
+        {'a': {1, 2, 3, 4}, 'd': {1}},
+        {'b': {1, 2}, 'c': {1, 2}},
+    ]
+    assert shard_folders({'a': {1}}, 4) == [{'a': {1}}]
+
+
+def test_reports_overrun(logger):
+    monitor = make_monitor(interval=1, logger=logger)
+    monitor.report_overrun(2.5, 10)
+    monitor.report_overrun(3, 10)
+    out = logger.get_output('info')
+    assert out.count('longer than the polling interval') == 1
+    monitor.report_overrun(0.5, 10)
+    monitor.report_overrun(2.5, 10)
+    out = logger.get_output('info')
+    assert out.count('longer than the polling interval') == 2
@@ -0,0 +1,60 @@
+import pytest
+import socket
+import threading
+
+from hupper.proxy import TCPProxy
+
+
+class EchoServer(threading.Thread):
+    daemon = True
+
+    def __init__(self, sock):
+        super(EchoServer, self).__init__()
+        self.sock = sock
+
+    def run(self):
+        conn, _ = self.sock.accept()
+        with conn:
+            for chunk in iter(lambda: conn.recv(1024), b''):
+                conn.sendall(chunk)
+
+
+@pytest.fixture
+def proxy(logger):
+    # reserve a port for the worker which is not listening yet
+    target = socket.socket()
+    target.bind(('127.0.0.1', 0))
+    proxy = TCPProxy(
+        '127.0.0.1:0',
+        '127.0.0.1:%d' % target.getsockname()[1],
+        logger,
+        hold_timeout=10,
+    )
+    proxy.target_sock = target
+    proxy.start()
+    yield proxy
+    proxy.stop()
+    proxy.join()
+    target.close()
+
+
+def test_forwards_once_the_worker_listens(proxy):
+    proxy.hold()
+    client = socket.create_connection(proxy.sock.getsockname(), timeout=10)
+    with client:
+        client.sendall(b'hello')
+        proxy.release()
+        # the connection is held until the worker accepts connections
+        proxy.target_sock.listen(1)
+        EchoServer(proxy.target_sock).start()
+        assert client.recv(5) == b'hello'
+        client.shutdown(socket.SHUT_WR)
+        assert client.recv(5) == b''
+
+
+def test_gives_up_after_hold_timeout(proxy, logger):
+    proxy.hold_timeout = 0.2
+    client = socket.create_connection(proxy.sock.getsockname(), timeout=10)
+    with client:
+        assert client.recv(5) == b''
+    assert 'Timed out waiting' in logger.get_output('error')
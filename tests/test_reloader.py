@@ -1,4 +1,8 @@
 import os
+import pytest
+import time
+
+from hupper.utils import WIN
 
 here = os.path.abspath(os.path.dirname(__file__))
 
@@ -99,6 +103,38 @@ def test_proxy_tracks_changes(logger):
     logger.reset()
 
 
+def test_proxy_clears_some_changes(logger):
+    class DummyMonitor:
+        def __call__(self, cb, **kw):
+            self.cb = cb
+            return self
+
+    cb = DummyCallback()
+    monitor = DummyMonitor()
+    proxy = make_proxy(monitor, cb, logger)
+    monitor.cb('foo.txt')
+    changes = proxy.get_changes()
+    monitor.cb('bar.txt')
+    assert proxy.changed_paths == {'foo.txt', 'bar.txt'}
+    cb.called = False
+    proxy.clear_changes(changes)
+    assert cb.called == {'bar.txt'}
+    assert proxy.is_changed
+
+    # a file which changed again after get_changes is not cleared
+    changes = proxy.get_changes()
+    monitor.cb('bar.txt')
+    cb.called = False
+    proxy.clear_changes(changes)
+    assert cb.called == {'bar.txt'}
+    assert proxy.is_changed
+
+    cb.called = False
+    proxy.clear_changes(proxy.get_changes())
+    assert not cb.called
+    assert not proxy.is_changed
+
+
 def test_ignore_files():
     class DummyMonitor:
         paths = set()
@@ -121,3 +157,396 @@ def test_ignore_files():
     assert path not in monitor.paths
     proxy.add_path(path)
     assert path not in monitor.paths
+
+
+def wait_for_digest(verifier, path):
+    for _ in range(100):
+        if path in verifier.digests:
+            return
+        time.sleep(0.01)
+    raise AssertionError('timeout waiting for digest')  # pragma: no cover
+
+
+def test_verifier_ignores_touch(tmpdir):
+    from hupper.reloader import ChangeVerifier
+
+    path = tmpdir.join('foo.py')
+    path.write('x = 1\n')
+    verifier = ChangeVerifier()
+    verifier.track(path.strpath)
+    wait_for_digest(verifier, path.strpath)
+    assert not verifier.is_changed(path.strpath)
+
+    os.utime(path.strpath, (time.time() + 10, time.time() + 10))
+    assert not verifier.is_changed(path.strpath)
+
+    path.write('x = 1\n')
+    assert not verifier.is_changed(path.strpath)
+
+    path.write('x = 2\n')
+    assert verifier.is_changed(path.strpath)
+    assert not verifier.is_changed(path.strpath)
+
+    path.remove()
+    assert verifier.is_changed(path.strpath)
+
+
+def test_verifier_reports_untracked_files(tmpdir):
+    from hupper.reloader import ChangeVerifier
+
+    path = tmpdir.join('foo.py')
+    path.write('x = 1\n')
+    verifier = ChangeVerifier()
+    assert verifier.is_changed(path.strpath)
+    os.utime(path.strpath, (time.time() + 10, time.time() + 10))
+    assert not verifier.is_changed(path.strpath)
+
+
+def test_proxy_drops_unmodified_files(tmpdir, logger):
+    from hupper.reloader import ChangeVerifier, FileMonitorProxy
+
+    class DummyMonitor:
+        def add_path(self, path):
+            pass
+
+    path = tmpdir.join('foo.py')
+    path.write('x = 1\n')
+    cb = DummyCallback()
+    proxy = FileMonitorProxy(cb, logger, verifier=ChangeVerifier())
+    proxy.monitor = DummyMonitor()
+    proxy.add_path(path.strpath)
+    wait_for_digest(proxy.verifier, path.strpath)
+
+    os.utime(path.strpath, (time.time() + 10, time.time() + 10))
+    proxy.file_changed(path.strpath)
+    assert not cb.called
+    assert 'contents did not change' in logger.get_output('debug')
+
+    path.write('x = 2\n')
+    proxy.file_changed(path.strpath)
+    assert cb.called == {path.strpath}
+
+
+def test_watch_manifest_roundtrip(tmpdir, logger):
+    from hupper.reloader import WatchManifest, get_file_signature
+
+    path = tmpdir.join('foo.py').ensure().strpath
+    signature = get_file_signature(path)
+    manifest = WatchManifest(
+        tmpdir.join('cache', 'hupper.json').strpath, logger
+    )
+    assert manifest.load() == {}
+
+    manifest.save({path: (signature, b'\x01\x02'), 'missing': (None, None)})
+    assert manifest.load() == {
+        path: (signature, b'\x01\x02'),
+        'missing': (None, None),
+    }
+
+    tmpdir.join('cache', 'hupper.json').write('{')
+    assert manifest.load() == {}
+    assert 'invalid watch manifest' in logger.get_output('error')
+
+
+def test_proxy_restores_paths(tmpdir, logger):
+    from hupper.reloader import (
+        ChangeVerifier,
+        FileMonitorProxy,
+        get_file_signature,
+    )
+
+    class DummyMonitor:
+        def __init__(self):
+            self.paths = []
+
+        def add_path(self, path):
+            self.paths.append(path)
+
+    path = tmpdir.join('foo.py')
+    path.write('x = 1\n')
+    signature = get_file_signature(path.strpath)
+    proxy = FileMonitorProxy(
+        DummyCallback(), logger, verifier=ChangeVerifier()
+    )
+    proxy.monitor = DummyMonitor()
+    proxy.restore_path(path.strpath, signature, b'digest')
+
+    assert proxy.monitor.paths == [path.strpath]
+    assert proxy.paths == set()
+    assert proxy.verifier.get_fingerprint(path.strpath) == (
+        signature,
+        b'digest',
+    )
+
+
+def test_proxy_forgets_unused_restored_paths(logger):
+    from hupper.reloader import FileMonitorProxy
+
+    class DummyMonitor:
+        def __init__(self):
+            self.paths = []
+
+        def add_path(self, path):
+            self.paths.append(path)
+
+    cb = DummyCallback()
+    proxy = FileMonitorProxy(cb, logger, ignore_files=['*.pyc'])
+    proxy.monitor = DummyMonitor()
+    proxy.restore_path('/a/foo.py')
+    proxy.restore_path('/a/bar.py')
+    proxy.restore_path('/a/foo.pyc')
+    assert proxy.monitor.paths == ['/a/foo.py', '/a/bar.py']
+
+    # changes are reported until the worker reports its own paths
+    proxy.file_changed('/a/bar.py')
+    assert cb.called == {'/a/bar.py'}
+    proxy.clear_changes()
+    cb.called = False
+
+    proxy.add_path('/a/foo.py')
+    proxy.forget_restored_paths()
+    proxy.file_changed('/a/bar.py')
+    assert not cb.called
+    proxy.file_changed('/a/foo.py')
+    assert cb.called == {'/a/foo.py'}
+
+
+def test_proxy_holds_changes_during_vcs_operation(tmpdir, logger):
+    from hupper.reloader import FileMonitorProxy, VCSQuiescence
+
+    class DummyMonitor:
+        def add_path(self, path):
+            pass
+
+    tmpdir.mkdir('.git')
+    foo = tmpdir.mkdir('pkg').join('foo.py').ensure().strpath
+    bar = tmpdir.join('bar.py').ensure().strpath
+    cb = DummyCallback()
+    quiescence = VCSQuiescence(logger, poll_interval=0.01)
+    proxy = FileMonitorProxy(cb, logger, quiescence=quiescence)
+    proxy.monitor = DummyMonitor()
+    proxy.add_path(foo)
+    proxy.add_path(bar)
+    assert quiescence.lock_paths == {tmpdir.join('.git', 'index.lock').strpath}
+
+    index_lock = tmpdir.join('.git', 'index.lock').ensure()
+    proxy.file_changed(foo)
+    proxy.file_changed(bar)
+    assert not cb.called
+    assert 'version control operation' in logger.get_output('info')
+
+    index_lock.remove()
+    quiescence.waiter.join()
+    assert cb.called == {foo, bar}
+
+
+def test_vcs_quiescence_ignores_stale_locks(tmpdir, logger):
+    from hupper.reloader import VCSQuiescence
+
+    tmpdir.mkdir('.hg')
+    path = tmpdir.join('foo.py').ensure().strpath
+    quiescence = VCSQuiescence(logger)
+    quiescence.track(path)
+    assert not quiescence.is_busy()
+
+    wlock = tmpdir.join('.hg', 'wlock').ensure().strpath
+    assert quiescence.is_busy()
+    mtime = time.time() - 3600
+    os.utime(wlock, (mtime, mtime))
+    assert not quiescence.is_busy()
+    assert not quiescence.hold(path, None)
+
+
+def test_proxy_settles_changes(logger):
+    from hupper.reloader import FileMonitorProxy
+
+    calls = []
+    proxy = FileMonitorProxy(
+        lambda paths: calls.append(set(paths)),
+        logger,
+        settle_interval=0.2,
+        max_settle_interval=10,
+    )
+    proxy.file_changed('foo.py')
+    time.sleep(0.05)
+    proxy.file_changed('bar.py')
+    assert not calls
+    assert not proxy.is_changed
+
+    proxy.settler.join()
+    assert calls == [{'foo.py', 'bar.py'}]
+    assert proxy.is_changed
+    assert 'Collected changes to 2 files' in logger.get_output('debug')
+
+
+def test_proxy_settles_repeated_writes(logger):
+    from hupper.reloader import FileMonitorProxy
+
+    cb = DummyCallback()
+    proxy = FileMonitorProxy(
+        cb, logger, settle_interval=0.2, max_settle_interval=10
+    )
+    # rewriting the same file keeps extending the quiet period
+    for _ in range(6):
+        proxy.file_changed('foo.py')
+        time.sleep(0.1)
+    assert not cb.called
+
+    proxy.settler.join()
+    assert cb.called == {'foo.py'}
+
+
+def test_proxy_settles_within_max_interval(logger):
+    from hupper.reloader import FileMonitorProxy
+
+    cb = DummyCallback()
+    proxy = FileMonitorProxy(
+        cb, logger, settle_interval=0.05, max_settle_interval=0.1
+    )
+    start = time.monotonic()
+    for i in range(20):
+        proxy.file_changed('foo%d.py' % i)
+        time.sleep(0.01)
+        if cb.called:
+            break
+    assert cb.called
+    assert time.monotonic() - start < 0.3
+
+
+def test_restart_policy_backs_off(logger):
+    from hupper.reloader import RestartPolicy, WorkerResult
+
+    policy = RestartPolicy(
+        logger, reload_interval=1, max_backoff=3, max_failures=4
+    )
+    delays = [
+        policy.decide(WorkerResult.RELOAD, 1, 0.5, False)[1] for _ in range(3)
+    ]
+    assert delays == [1, 2, 3]
+    assert 'restarting in 2.0 seconds' in logger.get_output('info')
+
+    # the circuit breaker opens after max_failures
+    result, _ = policy.decide(WorkerResult.RELOAD, 1, 0.5, False)
+    assert result == WorkerResult.WAIT
+    assert 'waiting for a file to change' in logger.get_output('info')
+
+    policy.reset()
+    assert policy.decide(WorkerResult.RELOAD, 1, 0.5, False) == (
+        WorkerResult.RELOAD,
+        1,
+    )
+
+
+def test_restart_policy_ignores_healthy_runs(logger):
+    from hupper.reloader import RestartPolicy, WorkerResult
+
+    policy = RestartPolicy(logger, reload_interval=1)
+    policy.decide(WorkerResult.RELOAD, 1, 0.5, False)
+    assert policy.failures == 1
+    # a file change, a long lived worker or a clean exit reset the backoff
+    assert policy.decide(WorkerResult.RELOAD, 1, 0.5, True)[1] == 1
+    policy.decide(WorkerResult.RELOAD, 1, 0.5, False)
+    assert policy.decide(WorkerResult.RELOAD, 1, 60, False)[1] == 1
+    policy.decide(WorkerResult.RELOAD, 1, 0.5, False)
+    assert policy.decide(WorkerResult.WAIT, 0, 0.5, False)[1] == 1
+    assert policy.failures == 0
+
+
+@pytest.mark.skipif(WIN, reason='waits in a separate process on windows')
+def test_reloader_waits_for_changes_in_process(logger):
+    from hupper.reloader import ControlSignal, Reloader, WorkerResult
+
+    class DummyMonitor:
+        is_changed = False
+
+    reloader = Reloader(None, None, logger)
+    reloader.monitor = DummyMonitor()
+    with reloader._start_control():
+        # a change that was already handled does not end the wait
+        os.write(reloader.control_w, ControlSignal.FILE_CHANGED)
+        os.write(reloader.control_w, ControlSignal.SIGHUP)
+        assert reloader._wait_for_changes() == (WorkerResult.RELOAD, None)
+
+        reloader.monitor.is_changed = True
+        os.write(reloader.control_w, ControlSignal.FILE_CHANGED)
+        assert reloader._wait_for_changes() == (WorkerResult.RELOAD, None)
+
+        reloader.monitor.is_changed = False
+        os.write(reloader.control_w, ControlSignal.SIGTERM)
+        assert reloader._wait_for_changes() == (WorkerResult.EXIT, None)
+
+
+@pytest.mark.skipif(WIN, reason='waits in a separate process on windows')
+def test_reloader_wait_returns_on_consumed_change(logger):
+    from hupper.reloader import (
+        ControlSignal,
+        FileMonitorProxy,
+        Reloader,
+        WorkerResult,
+    )
+
+    reloader = Reloader(None, None, logger)
+    with reloader._start_control():
+        reloader.monitor = FileMonitorProxy(
+            reloader._control_proxy(ControlSignal.FILE_CHANGED), logger
+        )
+        reloader.monitor.file_changed('foo.py')
+        # the worker loop consumed the signal before the worker died
+        os.read(reloader.control_r, 1)
+        reloader.monitor.file_changed('bar.py')
+        assert reloader._wait_for_changes() == (WorkerResult.RELOAD, None)
+
+
+def test_reloader_discards_stale_standby(logger):
+    from hupper.reloader import Reloader
+
+    class DummyMonitor:
+        changed_paths = set()
+
+    class DummyWorker:
+        is_alive = True
+        discarded = False
+
+        def discard(self):
+            self.discarded = True
+
+    reloader = Reloader(None, None, logger)
+    reloader.monitor = DummyMonitor()
+    reloader.standby_paths = {'/site-packages/foo.py'}
+
+    worker = reloader.standby_worker = DummyWorker()
+    reloader.monitor.changed_paths = {'/app/views.py'}
+    assert reloader._take_standby() is worker
+    assert not worker.discarded
+
+    # the standby imported an old version of a module that was upgraded
+    worker = reloader.standby_worker = DummyWorker()
+    reloader.monitor.changed_paths = {'/site-packages/foo.py'}
+    assert reloader._take_standby() is None
+    assert worker.discarded
+    assert 'foo.py changed' in logger.get_output('info')
+
+
+def test_reloader_waits_for_vcs_when_enabled(logger):
+    from hupper.reloader import Reloader, VCSQuiescence
+
+    class DummyMonitor:
+        def __init__(self, callback, **kw):
+            pass
+
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def join(self):
+            pass
+
+    reloader = Reloader(None, DummyMonitor, logger)
+    with reloader._start_control(), reloader._start_monitor():
+        assert reloader.monitor.quiescence is None
+
+    reloader = Reloader(None, DummyMonitor, logger, wait_for_vcs=True)
+    with reloader._start_control(), reloader._start_monitor():
+        assert isinstance(reloader.monitor.quiescence, VCSQuiescence)
@@ -0,0 +1,155 @@
+import os
+
+from hupper.watchdog import WatchPlanner
+
+
+def make_tree(tmpdir, layout):
+    paths = []
+    for relpath in layout:
+        path = tmpdir.join(*relpath.split('/')).ensure()
+        paths.append(path.strpath)
+    return paths
+
+
+def test_planner_coalesces_siblings(tmpdir):
+    paths = make_tree(
+        tmpdir, ['pkg/a/x.py', 'pkg/b/y.py', 'pkg/c/z.py', 'pkg/__init__.py']
+    )
+    planner = WatchPlanner([tmpdir.strpath], excluded=[])
+    assert planner.plan(paths) == [(tmpdir.strpath, True)]
+
+
+def test_planner_respects_ratio(tmpdir):
+    paths = make_tree(tmpdir, ['pkg/a/x.py', 'pkg/b/y.py'])
+    make_tree(tmpdir, ['pkg/b/data%d.txt' % i for i in range(5)])
+    planner = WatchPlanner([tmpdir.strpath], excluded=[])
+    assert sorted(planner.plan(paths)) == [
+        (os.path.dirname(paths[0]), False),
+        (os.path.dirname(paths[1]), False),
+    ]
+
+    planner = WatchPlanner([tmpdir.strpath], excluded=[], ratio=0.25)
+    assert planner.plan(paths) == [(tmpdir.strpath, True)]
+
+
+def test_planner_stays_within_roots(tmpdir):
+    root = tmpdir.join('project').strpath
+    paths = make_tree(tmpdir, ['project/x.py', 'lib/a/y.py', 'lib/b/z.py'])
+    planner = WatchPlanner([root], excluded=[])
+    assert sorted(planner.plan(paths)) == [
+        (tmpdir.join('lib', 'a').strpath, False),
+        (tmpdir.join('lib', 'b').strpath, False),
+        (root, False),
+    ]
+
+
+def test_planner_avoids_excluded_paths(tmpdir):
+    paths = make_tree(tmpdir, ['a/x.py', 'b/y.py', 'c/z.py'])
+    excluded = tmpdir.join('venv').strpath
+    planner = WatchPlanner([tmpdir.strpath], excluded=[excluded])
+    plan = planner.plan(paths)
+    assert len(plan) == 3
+    assert not any(recursive for _, recursive in plan)
+
+    planner = WatchPlanner(
+        [tmpdir.strpath], excluded=[tmpdir.join('a').strpath]
+    )
+    plan = planner.plan(paths)
+    assert sorted(plan) == [
+        (tmpdir.join('a').strpath, False),
+        (tmpdir.join('b').strpath, False),
+        (tmpdir.join('c').strpath, False),
+    ]
+
+
+def test_monitor_dispatches_changes(tmpdir, logger):
+    import queue
+
+    from hupper.watchdog import WatchdogFileMonitor
+
+    changes = queue.Queue()
+    monitor = WatchdogFileMonitor(changes.put, logger, roots=[tmpdir.strpath])
+    paths = make_tree(tmpdir, ['a/x.py', 'b/y.py'])
+    for path in paths:
+        monitor.add_path(path)
+    monitor.start()
+    try:
+        tmpdir.join('a', 'other.py').write('')
+        with open(paths[1], 'w') as fp:
+            fp.write('y = 1\n')
+        assert changes.get(timeout=5) == paths[1]
+        assert monitor._get_snapshot() == {
+            tmpdir.join('a').strpath: {'x.py'},
+            tmpdir.join('b').strpath: {'y.py'},
+        }
+    finally:
+        monitor.stop()
+        monitor.join()
+    assert not monitor.dispatcher.is_alive()
+
+
+def test_monitor_plans_watches_in_batches(tmpdir, logger):
+    import time
+
+    from hupper.watchdog import WatchdogFileMonitor
+
+    monitor = WatchdogFileMonitor(
+        lambda path: None, logger, roots=[tmpdir.strpath]
+    )
+    monitor.start()
+    try:
+        paths = make_tree(tmpdir, ['a/x.py', 'b/y.py', 'c/z.py'])
+        for path in paths:
+            monitor.add_path(path)
+        deadline = time.time() + 5
+        while list(monitor.watches) != [(tmpdir.strpath, True)]:
+            assert time.time() < deadline
+            time.sleep(0.05)
+        assert monitor.pending_dirpaths == []
+    finally:
+        monitor.stop()
+        monitor.join()
+    assert not monitor.plan_thread.is_alive()
+
+
+def test_monitor_filters_events(tmpdir, logger):
+    from watchdog.events import (
+        DirModifiedEvent,
+        FileModifiedEvent,
+        FileMovedEvent,
+    )
+
+    from hupper.watchdog import WatchdogFileMonitor
+
+    monitor = WatchdogFileMonitor(
+        lambda path: None, logger, roots=[tmpdir.strpath]
+    )
+    path = make_tree(tmpdir, ['a/x.py'])[0]
+    monitor.add_path(path)
+    backup = path + '~'
+    swap = tmpdir.join('a', '.x.py.swp').strpath
+
+    monitor.dispatch(DirModifiedEvent(os.path.dirname(path)))
+    monitor.dispatch(FileModifiedEvent(path + 'c'))
+    monitor.dispatch(FileModifiedEvent(swap))
+    assert monitor.changes.empty()
+
+    # vim moves the original to a backup file before writing
+    monitor.dispatch(FileMovedEvent(path, backup))
+    assert monitor.changes.get_nowait() == path
+    assert backup not in monitor.paths
+
+    # other editors atomically rename a temp file over the original
+    monitor.dispatch(FileMovedEvent(swap, path))
+    assert monitor.changes.get_nowait() == path
+    assert swap not in monitor.paths
+
+    monitor.dispatch(FileMovedEvent(path, path + '.new'))
+    assert monitor.changes.get_nowait() == path
+    assert path + '.new' in monitor.paths
+
+    # the patterns do not apply to files the app asked to watch
+    pyc = tmpdir.join('a', 'y.pyc').strpath
+    monitor.add_path(pyc)
+    monitor.dispatch(FileModifiedEvent(pyc))
+    assert monitor.changes.get_nowait() == pyc
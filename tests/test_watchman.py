@@ -0,0 +1,289 @@
+import json
+import os
+import queue
+import socket
+import threading
+
+from hupper.watchman import WatchmanFileMonitor
+
+
+class FakeWatchman:
+    def __init__(self, root):
+        self.root = root
+        self.commands = []
+        self.round_trips = 0
+
+    def __call__(self, msgs):
+        self.round_trips += 1
+        return [self.handle(msg) for msg in msgs]
+
+    def handle(self, msg):
+        self.commands.append(msg)
+        if msg[0] == 'watch-project':
+            return {'watch': self.root}
+        if msg[0] == 'query':
+            return {'files': [], 'clock': 'c:1:%d' % len(self.commands)}
+        return {'subscribe': msg[2], 'clock': 'c:1:%d' % len(self.commands)}
+
+    def subscriptions(self):
+        return [cmd for cmd in self.commands if cmd[0] == 'subscribe']
+
+
+def make_monitor(logger, root):
+    changes = []
+    monitor = WatchmanFileMonitor(changes.append, logger)
+    monitor.changes = changes
+    monitor._query_many = FakeWatchman(root)
+    monitor.connected = True
+    return monitor
+
+
+def flush(monitor):
+    # process the queued registrations in a single batch like the registrar
+    batch = []
+    while not monitor.registrations.empty():
+        batch.append(monitor.registrations.get_nowait())
+    monitor._register(
+        {v for k, v in batch if k == 'watch'},
+        {v for k, v in batch if k == 'subscribe'},
+    )
+
+
+def test_subscribes_to_watched_files(logger, tmpdir):
+    root = tmpdir.strpath
+    monitor = make_monitor(logger, root)
+    monitor.add_path(os.path.join(root, 'pkg', 'foo.py'))
+    flush(monitor)
+
+    (sub,) = monitor._query_many.subscriptions()
+    assert sub[1] == root
+    assert sub[3]['expression'] == [
+        'allof',
+        ['type', 'f'],
+        ['name', [os.path.join('pkg', 'foo.py')], 'wholename'],
+    ]
+    assert monitor.clocks[root] == 'c:1:2'
+
+
+def test_resubscribes_once_for_a_batch(logger, tmpdir):
+    root = tmpdir.strpath
+    monitor = make_monitor(logger, root)
+    monitor.add_path(os.path.join(root, 'foo.py'))
+    flush(monitor)
+    monitor.add_path(os.path.join(root, 'bar.py'))
+    monitor.add_path(os.path.join(root, 'sub', 'baz.py'))
+    flush(monitor)
+
+    subs = monitor._query_many.subscriptions()
+    assert len(subs) == 2
+    assert subs[1][3]['expression'][2][1] == [
+        'bar.py',
+        'foo.py',
+        os.path.join('sub', 'baz.py'),
+    ]
+    # the subscription resumes from the clock of the previous one after
+    # looking up earlier edits to the new files
+    (query,) = [c for c in monitor._query_many.commands if c[0] == 'query']
+    assert query[2]['since'] == 'c:1:2'
+    assert query[2]['expression'][2][1] == [
+        'bar.py',
+        os.path.join('sub', 'baz.py'),
+    ]
+    assert subs[1][3]['since'] == 'c:1:2'
+
+
+def test_reports_watched_files(logger, tmpdir):
+    root = tmpdir.strpath
+    monitor = make_monitor(logger, root)
+    path = os.path.join(root, 'foo.py')
+    monitor.add_path(path)
+    flush(monitor)
+    monitor._handle_result(
+        {
+            'subscription': 'foo',
+            'root': root,
+            'clock': 'c:1:9',
+            'files': ['foo.py', 'other.py'],
+        }
+    )
+    assert monitor.changes == [path]
+    assert monitor.clocks[root] == 'c:1:9'
+
+
+def test_ignores_earlier_edits_to_added_paths(logger, tmpdir):
+    root = tmpdir.strpath
+    fake = FakeWatchman(root)
+    events = []
+
+    def handle(msg):
+        result = FakeWatchman.handle(fake, msg)
+        if msg[0] == 'query':
+            result['files'] = ['bar.py']
+        elif msg[0] == 'subscribe' and msg[3]['since'] == 'c:1:2':
+            # the daemon reports the named files changed since the clock
+            events.append(
+                {
+                    'subscription': msg[2],
+                    'root': root,
+                    'clock': 'c:1:99',
+                    'files': ['bar.py', 'foo.py'],
+                }
+            )
+        return result
+
+    fake.handle = handle
+    monitor = make_monitor(logger, root)
+    monitor._query_many = fake
+    monitor.add_path(os.path.join(root, 'foo.py'))
+    flush(monitor)
+
+    # bar.py was modified after the first subscription but before it was
+    # imported by the worker while the change to foo.py was not delivered
+    # yet when the subscription was replaced
+    bar = os.path.join(root, 'bar.py')
+    monitor.add_path(bar)
+    flush(monitor)
+    for event in events:
+        monitor._handle_result(event)
+    assert monitor.changes == [os.path.join(root, 'foo.py')]
+    assert not monitor.suppressed
+
+    # later edits to bar.py are reported
+    monitor._handle_result(
+        {'subscription': 'foo', 'root': root, 'files': ['bar.py']}
+    )
+    assert monitor.changes[-1] == bar
+
+
+def test_pipelines_new_roots(logger, tmpdir):
+    monitor = make_monitor(logger, tmpdir.strpath)
+    fake = monitor._query_many
+    roots = {}
+
+    def handle(msg):
+        if msg[0] == 'watch-project':
+            fake.commands.append(msg)
+            return {'watch': roots.setdefault(msg[1], msg[1])}
+        return FakeWatchman.handle(fake, msg)
+
+    fake.handle = handle
+    for name in ('a', 'b', 'c'):
+        monitor.add_path(tmpdir.join(name, 'foo.py').strpath)
+    flush(monitor)
+
+    assert fake.round_trips == 2
+    assert sorted(monitor.watches) == sorted(roots)
+    assert len(fake.subscriptions()) == 3
+
+
+class FakeWatchmanServer(threading.Thread):
+    """A JSON-only watchman daemon listening on a unix socket."""
+
+    def __init__(self, sockpath, root):
+        super(FakeWatchmanServer, self).__init__()
+        self.daemon = True
+        self.root = root
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(sockpath)
+        self.listener.listen(5)
+        self.commands = queue.Queue()
+        self.conn = None
+        # commands which are not answered the next time they are received
+        self.ignored = set()
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                break
+            self.conn = conn
+            if conn.recv(1, socket.MSG_PEEK) != b'[':
+                # reject BSER
+                conn.close()
+                continue
+            try:
+                for line in conn.makefile('rb'):
+                    self.handle(json.loads(line))
+            except OSError:
+                pass
+            conn.close()
+
+    def handle(self, cmd):
+        if cmd[0] in self.ignored:
+            self.ignored.remove(cmd[0])
+        elif cmd[0] == 'version':
+            self.send({'version': '1.0'})
+        elif cmd[0] == 'watch-project':
+            self.send({'watch': self.root})
+        elif cmd[0] == 'subscribe':
+            self.send({'subscribe': cmd[2], 'clock': 'c:1:1'})
+        self.commands.put(cmd)
+
+    def send(self, msg):
+        self.conn.sendall(json.dumps(msg).encode('utf8') + b'\n')
+
+    def next_command(self, name):
+        while True:
+            cmd = self.commands.get(timeout=5)
+            if cmd[0] == name:
+                return cmd
+
+
+def test_reconnects_and_resumes_from_clock(logger, tmpdir):
+    root = tmpdir.mkdir('root').strpath
+    sockpath = tmpdir.join('sock').strpath
+    server = FakeWatchmanServer(sockpath, root)
+    server.start()
+    changes = queue.Queue()
+    monitor = WatchmanFileMonitor(changes.put, logger, sockpath=sockpath)
+    monitor.reconnect_delay = 0.01
+    monitor.start()
+    try:
+        path = os.path.join(root, 'foo.py')
+        monitor.add_path(path)
+        sub = server.next_command('subscribe')
+        server.send({'subscription': sub[2], 'root': root, 'clock': 'c:1:5'})
+
+        server.conn.shutdown(socket.SHUT_RDWR)
+        sub = server.next_command('subscribe')
+        assert sub[3]['since'] == 'c:1:5'
+        server.send(
+            {
+                'subscription': sub[2],
+                'root': root,
+                'clock': 'c:1:9',
+                'files': ['foo.py'],
+            }
+        )
+        assert changes.get(timeout=5) == path
+        assert 'Reconnected to watchman' in logger.get_output('info')
+    finally:
+        monitor.stop()
+        monitor.join()
+        server.listener.close()
+
+
+def test_reconnects_after_timeout(logger, tmpdir):
+    root = tmpdir.mkdir('root').strpath
+    sockpath = tmpdir.join('sock').strpath
+    server = FakeWatchmanServer(sockpath, root)
+    server.start()
+    monitor = WatchmanFileMonitor(
+        lambda path: None, logger, sockpath=sockpath, timeout=0.2
+    )
+    monitor.reconnect_delay = 0.01
+    monitor.start()
+    try:
+        server.ignored.add('subscribe')
+        monitor.add_path(os.path.join(root, 'foo.py'))
+        server.next_command('subscribe')
+        # the subscription is retried on a new connection
+        server.next_command('version')
+        sub = server.next_command('subscribe')
+        assert sub[1] == root
+        assert 'Timed out waiting' in logger.get_output('error')
+    finally:
+        monitor.stop()
+        monitor.join()
+        server.listener.close()
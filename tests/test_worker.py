@@ -0,0 +1,100 @@
+import os
+import pytest
+import socket
+import sys
+
+from hupper.utils import bind_socket
+from hupper.worker import WatchSysModules, Worker, get_reloader
+
+
+def serve_once():
+    (sock,) = get_reloader().sockets()
+    conn, _ = sock.accept()
+    conn.sendall(b'hello')
+    conn.close()
+
+
+def test_worker_shares_sockets():
+    sock = bind_socket('127.0.0.1:0')
+    worker = Worker(__name__ + '.serve_once', sockets=[sock])
+    try:
+        # the connection waits in the backlog until the worker accepts it
+        client = socket.create_connection(sock.getsockname(), timeout=10)
+        worker.start(lambda packet: None)
+        assert client.recv(5) == b'hello'
+        client.close()
+        worker.wait(10)
+    finally:
+        if worker.is_alive:
+            worker.kill()
+        worker.join()
+        sock.close()
+
+
+def noop():
+    pass
+
+
+@pytest.mark.parametrize('report_modules', [False, True])
+def test_worker_reports_modules_on_request(report_modules):
+    packets = []
+    worker = Worker(__name__ + '.noop', report_modules=report_modules)
+    try:
+        worker.start(packets.append)
+        worker.wait(10)
+    finally:
+        if worker.is_alive:
+            worker.kill()
+        worker.join()
+    commands = {packet[0] for packet in packets if packet is not None}
+    assert 'watch_files' in commands
+    assert ('system_modules' in commands) == report_modules
+
+
+def write_module(path, source):
+    path.write_text(source)
+    # avoid a stale pyc when the file is rewritten within the same second
+    mtime = os.stat(str(path)).st_mtime + 2
+    os.utime(str(path), (mtime, mtime))
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path
+    for name in ['hr_views', 'hr_routes', 'hr_app']:
+        sys.modules.pop(name, None)
+
+
+def test_hot_reload_dependents_in_order(project):
+    safe = '__hupper_reload_safe__ = True\n'
+    views = project / 'hr_views.py'
+    write_module(views, safe + 'def handle():\n    return 1\n')
+    write_module(
+        project / 'hr_routes.py', safe + 'from hr_views import handle\n'
+    )
+    write_module(project / 'hr_app.py', 'import hr_views\n')
+    import hr_app
+    import hr_routes
+
+    write_module(views, safe + 'def handle():\n    return 2\n')
+    poller = WatchSysModules(lambda paths: None)
+    poller.system_paths = []
+    assert poller.hot_reload([str(views)]) == ['hr_views', 'hr_routes']
+    assert hr_routes.handle() == 2
+    assert hr_app.hr_views.handle() == 2
+
+
+def test_hot_reload_refuses_unsafe_modules(project):
+    views = project / 'hr_views.py'
+    write_module(views, '__hupper_reload_safe__ = True\nclass View: pass\n')
+    write_module(project / 'hr_routes.py', 'from hr_views import View\n')
+    import hr_routes
+
+    poller = WatchSysModules(lambda paths: None)
+    poller.system_paths = []
+    with pytest.raises(RuntimeError, match='hr_routes is not reload-safe'):
+        poller.hot_reload([str(views)])
+    with pytest.raises(RuntimeError, match='is not an imported module'):
+        poller.hot_reload([str(project / 'foo.ini')])
+    assert hr_routes.View is sys.modules['hr_views'].View